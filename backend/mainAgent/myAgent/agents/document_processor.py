@@ -1,13 +1,22 @@
 # agents/document_processor.py
 
 import re
+import string
 from typing import List, Dict, Any, Tuple
 from dataclasses import dataclass
 from collections import defaultdict
 import logging
+try:
+    import re2  # optional: linear-time DFA matching for heading detection
+except ImportError:
+    re2 = None
 
 logger = logging.getLogger(__name__)
 
+# Every heading pattern starts with one of these characters, so anything
+# else can be rejected without running the regex at all
+HEADING_FIRST_CHARS = frozenset(string.ascii_uppercase + string.digits + '•-')
+
 @dataclass
 class DocumentSection:
     """Represents a logical section in the document."""
@@ -23,6 +32,19 @@ class DocumentSection:
         self.metadata = self.metadata or {}
 
 class DocumentProcessor:
+    # Checked in order; the first type with a matching keyword wins
+    SECTION_TYPES = {
+        'abstract': ['abstract', 'summary'],
+        'introduction': ['introduction', 'background'],
+        'methodology': ['method', 'approach', 'experiment'],
+        'results': ['result', 'finding', 'analysis'],
+        'discussion': ['discussion', 'analysis', 'evaluation'],
+        'conclusion': ['conclusion', 'summary', 'final'],
+        'references': ['reference', 'bibliography', 'citation'],
+        'appendix': ['appendix', 'attachment'],
+        'toc': ['table of contents', 'contents']
+    }
+
     def __init__(self):
         self.min_heading_length = 3
         self.max_heading_length = 100
@@ -34,52 +56,54 @@ class DocumentProcessor:
             # Level 3: Subsections
             (r'^(?:\d+\.\d+\.\s+[A-Z]|•\s+[A-Z]|-\s+[A-Z])', 3),
         ]
+        # Fuse the patterns into one alternation so a single match finds both
+        # the hit and its level; alternatives are tried in the order above.
+        self._heading_re = (re2 or re).compile('|'.join(
+            f'(?P<l{level}>{pattern})' for pattern, level in self.heading_patterns
+        ))
+        self._level_map = {f'l{level}': level for _, level in self.heading_patterns}
+        # One lookahead per section type, anchored at the start, so a single
+        # match keeps the type priority of SECTION_TYPES
+        self._section_type_re = re.compile('|'.join(
+            f'(?=.*(?:{"|".join(map(re.escape, keywords))}))(?P<{section_type}>)'
+            for section_type, keywords in self.SECTION_TYPES.items()
+        ), re.IGNORECASE | re.DOTALL)
         
     def is_heading(self, text: str) -> Tuple[bool, int]:
         """Check if text is a heading and return its level."""
         text = text.strip()
         if not (self.min_heading_length <= len(text) <= self.max_heading_length):
             return False, 0
+        if text[0] not in HEADING_FIRST_CHARS:
+            return False, 0
             
-        for pattern, level in self.heading_patterns:
-            if re.match(pattern, text):
-                return True, level
+        m = self._heading_re.match(text)
+        if m:
+            # Checked by name rather than m.lastgroup, which re2 may not provide
+            for group, level in self._level_map.items():
+                if m.group(group) is not None:
+                    return True, level
         return False, 0
         
     def process_document(self, pages: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Process the entire document with cross-page analysis."""
-        document_text = []
-        page_offsets = [0]  # Starting positions of each page in the full text
-        
-        # Combine all pages into a single document with page markers
-        for i, page in enumerate(pages, 1):
-            if not page.get('is_empty', False) and page.get('text'):
-                page_text = f"\n\n--- PAGE {i} ---\n{page['text']}\n"
-                document_text.append(page_text)
-                page_offsets.append(page_offsets[-1] + len(page_text))
-        
-        full_text = "".join(document_text)
-        
-        # Split into paragraphs while preserving page boundaries
+        # Split each page into paragraphs directly; the page number comes
+        # from the enumeration rather than from markers in a joined string
         paragraphs = []
-        current_page = 1
-        for i, para in enumerate(full_text.split('\n\n')):
-            para = para.strip()
-            if not para:
-                continue
-                
-            # Update current page based on page markers
-            if para.startswith('--- PAGE '):
-                current_page = int(para.split()[2])
+        for i, page in enumerate(pages, 1):
+            if page.get('is_empty', False) or not page.get('text'):
                 continue
-                
-            paragraphs.append({
-                'text': para,
-                'page': current_page,
-                'is_heading': False,
-                'level': 0,
-                'section_type': 'content'
-            })
+            for para in page['text'].split('\n\n'):
+                para = para.strip()
+                if not para:
+                    continue
+                paragraphs.append({
+                    'text': para,
+                    'page': i,
+                    'is_heading': False,
+                    'level': 0,
+                    'section_type': 'content'
+                })
         
         # Identify headings and their hierarchy
         sections = self._identify_sections(paragraphs)
@@ -90,7 +114,7 @@ class DocumentProcessor:
         return {
             'success': True,
             'sections': structured_content,
-            'page_count': len([p for p in pages if not p.get('is_empty', False)])
+            'page_count': sum(1 for p in pages if not p.get('is_empty', False))
         }
     
     def _identify_sections(self, paragraphs: List[Dict]) -> List[Dict]:
@@ -153,22 +177,5 @@ class DocumentProcessor:
     
     def _determine_section_type(self, heading: str) -> str:
         """Determine the type of section based on heading text."""
-        heading_lower = heading.lower()
-        
-        section_types = {
-            'abstract': ['abstract', 'summary'],
-            'introduction': ['introduction', 'background'],
-            'methodology': ['method', 'approach', 'experiment'],
-            'results': ['result', 'finding', 'analysis'],
-            'discussion': ['discussion', 'analysis', 'evaluation'],
-            'conclusion': ['conclusion', 'summary', 'final'],
-            'references': ['reference', 'bibliography', 'citation'],
-            'appendix': ['appendix', 'attachment'],
-            'toc': ['table of contents', 'contents']
-        }
-        
-        for section_type, keywords in section_types.items():
-            if any(keyword in heading_lower for keyword in keywords):
-                return section_type
-                
-        return 'content'
+        m = self._section_type_re.match(heading)
+        return m.lastgroup if m else 'content'
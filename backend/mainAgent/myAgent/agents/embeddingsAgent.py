@@ -1,14 +1,24 @@
 import os
+import bz2
+import math
 import logging
 import numpy as np
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer
 import pickle
 
 logger = logging.getLogger(__name__)
 
+# IVF-PQ needs enough vectors to train its coarse and product quantizers;
+# until the corpus reaches this size it stays in an FP16 flat index, which
+# needs no training, and is then rebuilt from every stored vector.
+IVFPQ_MIN_VECTORS = 50000
+PQ_SUBQUANTIZERS = 64
+IVF_NPROBE = 16
+
 class EmbeddingsAgent:
     def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
         """
@@ -17,22 +27,61 @@ class EmbeddingsAgent:
         Args:
             model_name: Name of the sentence transformer model to use
         """
-        self.model = SentenceTransformer(model_name)
+        self.model = self._load_model(model_name)
         self.embeddings_index = None
-        self.documents = []
+        # Document fields as parallel lists, one entry per index row
+        self._texts: List[str] = []
+        self._metas: List[Dict] = []
         self.index_path = Path('data/embeddings_index.faiss')
         self.documents_path = Path('data/documents.pkl')
         
         # Create data directory if it doesn't exist
         os.makedirs('data', exist_ok=True)
         
+    def _load_model(self, model_name: str) -> SentenceTransformer:
+        """
+        Load the sentence transformer, using an ONNX Runtime export when
+        USE_ONNX=1 is set and falling back to PyTorch otherwise
+        """
+        if os.getenv('USE_ONNX') == '1':
+            onnx_dir = Path('data/onnx') / model_name.replace('/', '_')
+            provider = 'CUDAExecutionProvider' if torch.cuda.is_available() else 'CPUExecutionProvider'
+            try:
+                if onnx_dir.exists():
+                    return SentenceTransformer(
+                        str(onnx_dir), backend='onnx', model_kwargs={'provider': provider}
+                    )
+                model = SentenceTransformer(
+                    model_name, backend='onnx', model_kwargs={'provider': provider}
+                )
+                model.save(str(onnx_dir))
+                return model
+            except Exception as e:
+                logger.warning(f"ONNX export unavailable, using PyTorch model: {str(e)}")
+        
+        model = SentenceTransformer(model_name)
+        if torch.cuda.is_available():
+            model.half()
+        return model
+    
     def _load_index(self) -> bool:
         """Load existing FAISS index if available"""
         if self.index_path.exists() and self.documents_path.exists():
             try:
                 self.embeddings_index = faiss.read_index(str(self.index_path))
+                if isinstance(self.embeddings_index, faiss.IndexIVF):
+                    self.embeddings_index.nprobe = IVF_NPROBE
                 with open(self.documents_path, 'rb') as f:
-                    self.documents = pickle.load(f)
+                    compressed = f.read(3) == b'BZh'
+                # Older indexes wrote the documents pickle uncompressed
+                opener = bz2.open if compressed else open
+                with opener(self.documents_path, 'rb') as f:
+                    self._set_documents(pickle.load(f))
+                if self.embeddings_index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                    # Saved before embeddings were normalized: L2 over raw vectors
+                    logger.info(f"Rebuilding L2 index as a cosine index from {len(self._texts)} stored texts")
+                    self._rebuild_index()
+                    self._save_index()
                 return True
             except Exception as e:
                 logger.error(f"Error loading index: {str(e)}")
@@ -42,9 +91,92 @@ class EmbeddingsAgent:
     def _save_index(self):
         """Save the current index and documents to disk"""
         if self.embeddings_index is not None:
+            if isinstance(self.embeddings_index, faiss.IndexFlat):
+                # Flat FP32 indexes are stored as FP16; FAISS dequantizes at search time
+                self.embeddings_index = self._to_fp16_index(self.embeddings_index)
             faiss.write_index(self.embeddings_index, str(self.index_path))
-            with open(self.documents_path, 'wb') as f:
-                pickle.dump(self.documents, f)
+            with bz2.open(self.documents_path, 'wb', compresslevel=9) as f:
+                pickle.dump({
+                    'texts': self._texts,
+                    'metas': self._metas
+                }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def _set_documents(self, stored: Any):
+        """Restore document columns from a pickle, accepting the old list-of-dicts format"""
+        if isinstance(stored, dict):
+            self._texts = stored['texts']
+            self._metas = stored['metas']
+        else:
+            self._texts = [doc['text'] for doc in stored]
+            self._metas = [doc.get('metadata', {}) for doc in stored]
+    
+    @staticmethod
+    def _to_fp16_index(index: faiss.IndexFlat) -> faiss.Index:
+        """Re-encode a flat FP32 index as an FP16 scalar-quantized index"""
+        fp16_index = faiss.IndexScalarQuantizer(
+            index.d, faiss.ScalarQuantizer.QT_fp16, index.metric_type
+        )
+        if index.ntotal:
+            fp16_index.add(index.reconstruct_n(0, index.ntotal))
+        return fp16_index
+    
+    @staticmethod
+    def _new_index(d: int) -> faiss.Index:
+        """
+        Create an FP16 scalar-quantized index (2x smaller than FP32)
+        
+        FP16 encoding needs no training, so it is correct for any batch size,
+        including a first batch of a single vector.
+        Embeddings are unit-normalized, so inner product is cosine similarity.
+        """
+        return faiss.IndexScalarQuantizer(
+            d, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+        )
+    
+    def _maybe_upgrade_index(self):
+        """
+        Rebuild the index as IVF-PQ once the corpus is large enough
+        
+        The quantizers are trained on every stored vector, not on the batch
+        that crossed the threshold (sub-linear search, ~50x smaller).
+        """
+        index = self.embeddings_index
+        n, d = index.ntotal, index.d
+        if isinstance(index, faiss.IndexIVF) or n < IVFPQ_MIN_VECTORS or d % PQ_SUBQUANTIZERS:
+            return
+        
+        vectors = index.reconstruct_n(0, n)
+        nlist = max(1, min(4096, 4 * int(math.sqrt(n))))
+        quantizer = faiss.IndexFlatIP(d)
+        ivfpq_index = faiss.IndexIVFPQ(
+            quantizer, d, nlist, PQ_SUBQUANTIZERS, 8, faiss.METRIC_INNER_PRODUCT
+        )
+        ivfpq_index.train(vectors)
+        ivfpq_index.nprobe = IVF_NPROBE
+        ivfpq_index.add(vectors)
+        self.embeddings_index = ivfpq_index
+    
+    def _encode_documents(self, texts: List[str]) -> np.ndarray:
+        """Encode texts as unit-length float32 vectors for the index"""
+        # encode() already length-sorts its batches internally; FAISS
+        # expects float32 even when the model runs in half precision
+        return self.model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+    
+    def _rebuild_index(self):
+        """Re-embed every stored text into a fresh inner-product index"""
+        if not self._texts:
+            self.embeddings_index = None
+            return
+        embeddings = self._encode_documents(self._texts)
+        self.embeddings_index = self._new_index(embeddings.shape[1])
+        self.embeddings_index.add(embeddings)
+        self._maybe_upgrade_index()
     
     def create_embeddings(self, texts: List[str], metadata: List[Dict] = None) -> Dict[str, Any]:
         """
@@ -58,26 +190,23 @@ class EmbeddingsAgent:
             Dictionary containing the embeddings and metadata
         """
         try:
-            # Generate embeddings
-            embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=True)
+            embeddings = self._encode_documents(texts)
             
             # Initialize or update FAISS index
             if self.embeddings_index is None:
-                self.embeddings_index = faiss.IndexFlatL2(embeddings.shape[1])
-                self.documents = []
+                self.embeddings_index = self._new_index(embeddings.shape[1])
+                self._texts, self._metas = [], []
             
             # Add to documents with metadata
             if metadata is None:
                 metadata = [{} for _ in range(len(texts))]
                 
-            for text, meta in zip(texts, metadata):
-                self.documents.append({
-                    'text': text,
-                    'metadata': meta
-                })
+            self._texts.extend(texts)
+            self._metas.extend(metadata)
             
             # Add embeddings to index
             self.embeddings_index.add(embeddings)
+            self._maybe_upgrade_index()
             
             # Save the updated index
             self._save_index()
@@ -86,7 +215,7 @@ class EmbeddingsAgent:
                 'success': True,
                 'count': len(texts),
                 'dimension': embeddings.shape[1],
-                'total_documents': len(self.documents)
+                'total_documents': len(self._texts)
             }
             
         except Exception as e:
@@ -107,33 +236,58 @@ class EmbeddingsAgent:
         Returns:
             List of similar documents with scores
         """
+        results = self.search_similar_batch([query], k)
+        return results[0] if results else []
+    
+    def search_similar_batch(self, queries: List[str], k: int = 5) -> List[List[Dict]]:
+        """
+        Search for similar documents to several queries at once
+        
+        All queries are encoded in a single forward pass and searched with a
+        single index lookup.
+        
+        Args:
+            queries: The search query strings
+            k: Number of results to return per query
+            
+        Returns:
+            One list of similar documents with scores per query
+        """
         try:
-            if self.embeddings_index is None or len(self.documents) == 0:
-                return []
+            if self.embeddings_index is None or not self._texts:
+                return [[] for _ in queries]
                 
-            # Encode the query
-            query_embedding = self.model.encode([query], convert_to_numpy=True)
+            # Encode all queries in one batch, normalized like the documents
+            query_embeddings = self.model.encode(
+                queries,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                batch_size=64,
+                show_progress_bar=False
+            ).astype(np.float32, copy=False)
             
             # Search the index
-            distances, indices = self.embeddings_index.search(query_embedding, k)
+            scores, indices = self.embeddings_index.search(query_embeddings, k)
             
             # Get the results
-            results = []
-            for idx, distance in zip(indices[0], distances[0]):
-                if idx < len(self.documents):  # Ensure index is valid
-                    doc = self.documents[idx]
-                    results.append({
-                        'text': doc['text'],
-                        'metadata': doc.get('metadata', {}),
-                        'score': float(distance)
-                    })
+            all_results = []
+            for row_indices, row_scores in zip(indices, scores):
+                results = []
+                for idx, score in zip(row_indices, row_scores):
+                    if 0 <= idx < len(self._texts):  # Ensure index is valid
+                        results.append({
+                            'text': self._texts[idx],
+                            'metadata': self._metas[idx],
+                            'score': float(score)  # Cosine similarity, higher is closer
+                        })
+                all_results.append(results)
             
-            return results
+            return all_results
             
         except Exception as e:
             logger.error(f"Error in similarity search: {str(e)}")
-            return []
+            return [[] for _ in queries]
     
     def get_document_count(self) -> int:
         """Get the total number of documents in the index"""
-        return len(self.documents) if self.documents else 0
+        return len(self._texts)
@@ -1,20 +1,60 @@
 from typing import Dict, List, Any, Optional
 import os
 import json
+import asyncio
+import hashlib
 import logging
-from openai import OpenAI
+from pathlib import Path
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib json module
+    orjson = None
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on cached chunk results; least recently used entries go first
+LLM_CACHE_MAX_ENTRIES = 10000
+
+
+def _json_loads(data: str) -> Any:
+    """Parse JSON with orjson when installed; both raise json.JSONDecodeError."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps_indented(obj: Any) -> str:
+    """Serialize obj as 2-space indented JSON for prompts."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+        except TypeError:
+            pass  # e.g. non-string keys; the stdlib handles these
+    return json.dumps(obj, indent=2)
+
 class LLMAgent:
+    REQUIRED_CHUNK_FIELDS = [
+        'chunk_id', 'order_index', 'confidence', 'reason',
+        'is_duplicate', 'section_label', 'detected_page_number',
+        'heading_buffer', 'content_buffer'
+    ]
+    # Part of every chunk cache key; bump when the chunk prompts change
+    CHUNK_PROMPT_VERSION = 1
+    # Chunks per batched prompt, and reply tokens allowed per chunk, so one
+    # prompt and its reply stay well inside the model context
+    MAX_CHUNK_BATCH = 8
+    CHUNK_MAX_TOKENS = 1000
+
     def __init__(
         self, 
         model: str = "llama3",
         temperature: float = 0.0,
-        base_url: str = "http://localhost:11434/v1"
+        base_url: str = "http://localhost:11434/v1",
+        max_concurrent_requests: int = 4
     ):
         """Initialize the LLM agent with configuration.
         
@@ -22,10 +62,18 @@ class LLMAgent:
             model: The Ollama model name to use (e.g., 'llama3')
             temperature: Controls randomness (0.0 to 1.0)
             base_url: Base URL for the Ollama API
+            max_concurrent_requests: Chunk requests aprocess_chunks keeps in
+                flight at once (match Ollama's OLLAMA_NUM_PARALLEL)
         """
         self.model = model
         self.temperature = temperature
+        self.max_concurrent_requests = max(1, max_concurrent_requests)
         self.client = OpenAI(base_url=base_url, api_key='ollama')
+        self.aclient = AsyncOpenAI(base_url=base_url, api_key='ollama')
+        # Successful chunk results, one JSON file per content hash; the
+        # directory is created on the first write
+        self.cache_dir = Path('data/llm_cache')
+        self._cache_dir_ready = False
         logger.info(f"Initialized Ollama with model: {model}")
 
 
@@ -76,16 +124,26 @@ class LLMAgent:
             # Remove duplicate temperature if passed in kwargs
             kwargs.pop("temperature", None)
 
-            response = self.client.chat.completions.create(
+            # Drop any caller-supplied stream flag; the response is always streamed
+            kwargs.pop("stream", None)
+
+            stream = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 temperature=self.temperature,  # Use class-level one
+                stream=True,
                 **kwargs
             )
 
+            # Consume tokens as they arrive instead of blocking on the full completion
+            parts = []
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+
             return {
                 "success": True,
-                "result": response.choices[0].message.content,
+                "result": "".join(parts),
                 "model": self.model,
                 "provider": "ollama"
             }
@@ -101,6 +159,51 @@ class LLMAgent:
 
 
 
+    async def _aquery_ollama(
+        self,
+        user_prompt: str,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Query Ollama model without blocking the event loop."""
+        try:
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+            messages.append({"role": "user", "content": user_prompt})
+
+            kwargs.pop("temperature", None)
+            kwargs.pop("stream", None)
+
+            stream = await self.aclient.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                stream=True,
+                **kwargs
+            )
+
+            parts = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+
+            return {
+                "success": True,
+                "result": "".join(parts),
+                "model": self.model,
+                "provider": "ollama"
+            }
+
+        except Exception as e:
+            logger.error(f"Error querying Ollama model: {str(e)}", exc_info=True)
+            return {
+                "success": False,
+                "error": str(e),
+                "model": self.model,
+                "provider": "ollama"
+            }
+
     def _process_response(
         self, 
         answer: str, 
@@ -109,7 +212,7 @@ class LLMAgent:
         """Process the API response into a standardized format."""
         # Try to parse as JSON if possible
         try:
-            answer_json = json.loads(answer)
+            answer_json = _json_loads(answer)
             if isinstance(answer_json, dict):
                 answer = answer_json
         except json.JSONDecodeError:
@@ -143,6 +246,73 @@ class LLMAgent:
         Returns:
             Dictionary with the processed chunk and metadata
         """
+        # Identical content (repeated headers, footers, boilerplate) always
+        # reconstructs the same way, so skip the round trip when seen before
+        cache_path, cached = self._cached_chunk_result(chunk)
+        if cached is not None:
+            return cached
+        
+        system_prompt, user_prompt = self._chunk_prompts(chunk)
+        
+        # Call the LLM with strict JSON response format
+        result = self.query(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=0.1,  # Keep it deterministic
+            max_tokens=self.CHUNK_MAX_TOKENS
+        )
+        
+        return self._chunk_result(chunk, result, cache_path)
+
+    async def aprocess_chunk(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async version of process_chunk.
+        
+        Uses the async client so many chunks can be in flight at once and
+        Ollama can batch them server-side.
+        """
+        cache_path, cached = self._cached_chunk_result(chunk)
+        if cached is not None:
+            return cached
+        
+        system_prompt, user_prompt = self._chunk_prompts(chunk)
+        result = await self._aquery_ollama(
+            user_prompt,
+            system_prompt,
+            max_tokens=self.CHUNK_MAX_TOKENS
+        )
+        return self._chunk_result(chunk, result, cache_path)
+
+    async def aprocess_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process chunks concurrently; results are returned in input order.
+        
+        At most max_concurrent_requests chunks are in flight at once, so a
+        large document does not flood the single Ollama server.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        
+        async def bounded(chunk: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.aprocess_chunk(chunk)
+        
+        return await asyncio.gather(*[bounded(chunk) for chunk in chunks])
+
+    def _cached_chunk_result(self, chunk: Dict[str, Any]):
+        """Return the chunk's cache path and its cached result, if any."""
+        cache_path = self._chunk_cache_path(chunk)
+        cached = self._read_chunk_cache(cache_path)
+        if cached is None:
+            return cache_path, None
+        if 'chunk_id' in chunk:
+            cached['chunk_id'] = chunk['chunk_id']
+        return cache_path, {
+            'success': True,
+            'result': cached
+        }
+
+    def _chunk_prompts(self, chunk: Dict[str, Any]):
+        """Build the system and user prompts for reconstructing one chunk."""
         # Prepare the system prompt for reconstruction
         system_prompt = """You are a strict document reconstruction assistant. 
         Preserve all text exactly. Output MUST be valid JSON following the schema. 
@@ -162,16 +332,16 @@ class LLMAgent:
         - content_buffer: Original content (unchanged)
         
         Chunk data:
-        {json.dumps(chunk, indent=2)}"""
-        
-        # Call the LLM with strict JSON response format
-        result = self.query(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            temperature=0.1,  # Keep it deterministic
-            max_tokens=1000
-        )
-        
+        {_json_dumps_indented(chunk)}"""
+        return system_prompt, user_prompt
+
+    def _chunk_result(
+        self,
+        chunk: Dict[str, Any],
+        result: Dict[str, Any],
+        cache_path: Path
+    ) -> Dict[str, Any]:
+        """Validate an LLM reply for a chunk and cache it on success."""
         if not result['success']:
             return {
                 'success': False,
@@ -180,10 +350,10 @@ class LLMAgent:
             }
             
         # Ensure the response has all required fields
-        response = result['answer']
+        response = result.get('result', result.get('answer'))
         if isinstance(response, str):
             try:
-                response = json.loads(response)
+                response = _json_loads(response)
             except json.JSONDecodeError:
                 return {
                     'success': False,
@@ -193,11 +363,7 @@ class LLMAgent:
                 }
                 
         # Validate required fields
-        required_fields = [
-            'chunk_id', 'order_index', 'confidence', 'reason',
-            'is_duplicate', 'section_label', 'detected_page_number',
-            'heading_buffer', 'content_buffer'
-        ]
+        required_fields = self.REQUIRED_CHUNK_FIELDS
         
         if not all(field in response for field in required_fields):
             return {
@@ -207,7 +373,170 @@ class LLMAgent:
                 'response': response
             }
             
+        self._write_chunk_cache(cache_path, response)
         return {
             'success': True,
             'result': response
-        }
\ No newline at end of file
+        }
+
+    def process_chunks_batch(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process several document chunks with a single LLM call.
+        
+        Cached chunks are answered from the cache; the rest are packed into
+        prompts of up to MAX_CHUNK_BATCH chunks, each asking for a JSON array
+        with one object per chunk. If the
+        batched response cannot be used, or an entry's chunk_id does not match
+        the chunk at its position, that chunk falls back to process_chunk.
+        
+        Args:
+            chunks: List of chunk dictionaries (see process_chunk)
+            
+        Returns:
+            One process_chunk-style result per input chunk, in input order
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+        pending = []
+        for i, chunk in enumerate(chunks):
+            cache_path, cached = self._cached_chunk_result(chunk)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, chunk, cache_path))
+        
+        for start in range(0, len(pending), self.MAX_CHUNK_BATCH):
+            batch_pending = pending[start:start + self.MAX_CHUNK_BATCH]
+            if len(batch_pending) == 1:
+                i, chunk, _ = batch_pending[0]
+                results[i] = self.process_chunk(chunk)
+                continue
+            
+            batch = [chunk for _, chunk, _ in batch_pending]
+            responses = self._query_chunk_batch(batch)
+            for (i, chunk, cache_path), response in zip(batch_pending, responses or [None] * len(batch_pending)):
+                if self._is_batch_response_for(chunk, response):
+                    self._write_chunk_cache(cache_path, response)
+                    results[i] = {'success': True, 'result': response}
+                else:
+                    results[i] = self.process_chunk(chunk)
+        
+        return results
+
+    def _is_batch_response_for(self, chunk: Dict[str, Any], response: Any) -> bool:
+        """
+        Check that a batched entry is complete and answers this chunk.
+        
+        Entries are matched by position, so a skipped or reordered entry
+        would otherwise be cached under another chunk's content hash.
+        """
+        if not isinstance(response, dict):
+            return False
+        if not all(field in response for field in self.REQUIRED_CHUNK_FIELDS):
+            return False
+        if 'chunk_id' not in chunk:
+            return False  # Nothing to verify the position against
+        return str(response['chunk_id']) == str(chunk['chunk_id'])
+
+    def _query_chunk_batch(self, chunks: List[Dict[str, Any]]) -> Optional[List[Any]]:
+        """Send chunks in one prompt; returns the parsed JSON array or None."""
+        system_prompt = f"""You are a strict document reconstruction assistant. 
+        Preserve all text exactly. Output MUST be a valid JSON array of exactly 
+        {len(chunks)} objects, one per input chunk, in input order. 
+        Never add extra text or commentary."""
+        
+        user_prompt = f"""Analyze each document chunk and return, for each one, a JSON object with:
+        - chunk_id: The original chunk ID
+        - order_index: Estimated position in document (1 = first)
+        - confidence: 0.0-1.0 confidence score
+        - reason: Brief justification for the order
+        - is_duplicate: Boolean indicating if this is a duplicate
+        - duplicate_of: chunk_id of duplicate if applicable
+        - section_label: Detected section name if any
+        - detected_page_number: Extracted page number if found
+        - heading_buffer: Original headings (unchanged)
+        - content_buffer: Original content (unchanged)
+        
+        Chunk data:
+        {_json_dumps_indented({'chunks': chunks})}"""
+        
+        result = self.query(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            temperature=0.1,  # Keep it deterministic
+            max_tokens=self.CHUNK_MAX_TOKENS * min(len(chunks), self.MAX_CHUNK_BATCH)
+        )
+        if not result['success']:
+            logger.warning(f"Batched chunk query failed: {result.get('error')}")
+            return None
+        
+        response = result.get('result')
+        if isinstance(response, str):
+            try:
+                response = _json_loads(response)
+            except json.JSONDecodeError:
+                logger.warning("Batched chunk query returned invalid JSON")
+                return None
+        
+        if not isinstance(response, list) or len(response) != len(chunks):
+            logger.warning("Batched chunk query returned the wrong number of results")
+            return None
+        return response
+
+    def _chunk_cache_path(self, chunk: Dict[str, Any]) -> Path:
+        """
+        Cache file for a chunk, keyed on the model, the prompt version and
+        the chunk content without the chunk_id.
+        """
+        content = {key: value for key, value in chunk.items() if key != 'chunk_id'}
+        key_data = {
+            'model': self.model,
+            'prompt_version': self.CHUNK_PROMPT_VERSION,
+            'chunk': content
+        }
+        key = hashlib.sha256(
+            json.dumps(key_data, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def _read_chunk_cache(self, cache_path: Path) -> Optional[Dict[str, Any]]:
+        """Load a cached chunk result, or None on a miss."""
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            os.utime(cache_path)  # Mark as recently used for eviction
+            return cached
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable LLM cache entry {cache_path}: {str(e)}")
+            return None
+
+    def _write_chunk_cache(self, cache_path: Path, response: Dict[str, Any]):
+        """Store a validated chunk result; cache failures never fail the chunk."""
+        try:
+            if not self._cache_dir_ready:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._cache_dir_ready = True
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(response, f, ensure_ascii=False)
+            self._prune_chunk_cache()
+        except (OSError, TypeError) as e:
+            logger.warning(f"Could not write LLM cache entry {cache_path}: {str(e)}")
+
+    def _prune_chunk_cache(self):
+        """
+        Evict the least recently used entries above LLM_CACHE_MAX_ENTRIES.
+        
+        Runs after each write, which always follows an LLM call, so the
+        directory scan is small next to the request it caches.
+        """
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.json')]
+        excess = len(entries) - LLM_CACHE_MAX_ENTRIES
+        if excess <= 0:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass  # Already removed by a concurrent writer
@@ -8,16 +8,143 @@ Responsibilities:
 - Use LLM to make final ordering decisions
 - Handle edge cases (empty pages, duplicates, etc.)
 """
+import functools
+import hashlib
+import itertools
+import json
 import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import torch
 from sentence_transformers import SentenceTransformer
 
 from .llmAgent import LLMAgent
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_CACHE_SIZE = 4096
+
+# Page text fed to the embedding model: attention is capped at EMBEDDING_MAX_TOKENS,
+# and 1500 characters comfortably covers that many tokens, so longer text would only
+# be tokenized to be truncated
+EMBEDDING_TEXT_CHARS = 1500
+EMBEDDING_MAX_TOKENS = 256
+
+# Page embeddings keyed on (model name, blake2b digest of the page text). Module
+# level because services create a fresh PageOrderingAgent per request.
+_embedding_cache = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+# Flow-score patterns, compiled once and run once per page
+_ROMAN_RE = re.compile(r'\b(article|part|chapter)\s+([ivxlcdm]+)\b', re.IGNORECASE)
+_CLAUSE_RE = re.compile(r'([ivxlcdm]+)\)|(\d+)\)', re.IGNORECASE)
+_NUM_RE = re.compile(r'\b(\d+)\b')
+
+# LLM response parsing
+_JSON_DECODER = json.JSONDecoder()
+_JSON_START_RE = re.compile(r'[{\[]')
+_REASONING_RE = re.compile(r'reasoning["\']?\s*[:=]\s*["\']?([^"\']+)["\']?', re.IGNORECASE)
+
+ORDER_PROMPT_HEADER = (
+    "You are an AI assistant that reorders JUMBLED PDF pages.\n"
+    "IMPORTANT: The pages below are OUT OF ORDER and need to be reordered.\n"
+    "Do NOT assume they are already in the correct order - analyze the content carefully.\n\n"
+    "Analyze the following pages and determine their correct logical order.\n"
+    "Consider:\n"
+    "- Title pages and table of contents typically come first\n"
+    "- Introduction/Executive Summary comes before main content\n"
+    "- Sections should follow a logical sequence (Article I, Article II, etc.)\n"
+    "- Sequential numbering or references indicate order\n"
+    "- Conclusion/Summary comes at the end\n"
+    "- References/Appendices come last\n"
+    "- For loan agreements: Title page → Definitions → Terms → Conditions → Signatures\n\n"
+    "Pages to reorder (these are CURRENTLY OUT OF ORDER):\n"
+)
+
+# Formatted with last_index; literal braces in the JSON example are doubled
+ORDER_PROMPT_FOOTER = (
+    "\n\n" + "=" * 80 + "\n"
+    "CRITICAL INSTRUCTIONS:\n" + "=" * 80 + "\n"
+    "These pages are DEFINITELY JUMBLED and OUT OF ORDER.\n"
+    "The PDF was scanned/merged incorrectly, so the page sequence is wrong.\n"
+    "You MUST analyze the CONTENT of each page to determine the correct order.\n\n"
+    "DO NOT assume pages are in order just because their indices are sequential.\n"
+    "DO NOT return [0, 1, 2, 3...] - that would mean no reordering is needed.\n\n"
+    "ANALYZE EACH PAGE'S CONTENT for:\n"
+    "1. Title/Header text (e.g., 'LOAN AGREEMENT', 'ARTICLE I', 'DEFINITIONS')\n"
+    "2. Section numbers or references (e.g., 'Article I' should come before 'Article II')\n"
+    "3. Sequential content (e.g., definitions before terms, terms before conditions)\n"
+    "4. Page numbers mentioned in the text itself\n"
+    "5. Logical flow (introduction → main content → conclusion)\n\n"
+    "For loan agreements, typical order is:\n"
+    "1. Title page (LOAN AGREEMENT BETWEEN...)\n"
+    "2. Definitions section\n"
+    "3. Terms and conditions\n"
+    "4. Specific clauses (Article I, II, III...)\n"
+    "5. Signatures/Appendices\n\n"
+    "You must respond with ONLY valid JSON in this exact format:\n"
+    "{{\"order\": [0, 2, 1, 3], \"reasoning\": \"Explanation here\"}}\n"
+    "Where 'order' is an array of page indices (0-based) in the correct sequence.\n"
+    "Example: [0, 2, 1, 3] means:\n"
+    "  - First: page at index 0\n"
+    "  - Second: page at index 2\n"
+    "  - Third: page at index 1\n"
+    "  - Fourth: page at index 3\n"
+    "The 'order' array must contain ALL page indices from 0 to {last_index} exactly once.\n"
+    "If you return [0, 1, 2, 3...], you are saying pages are already in order - ONLY do this if you are 100% certain.\n"
+    "Do not include any text before or after the JSON object.\n"
+    "Response:\n"
+)
+
+
+# Dynamically quantized INT8 weights written next to the ONNX export
+ONNX_QUANTIZED_FILE = 'onnx/model_qint8_avx512_vnni.onnx'
+
+
+@functools.lru_cache(maxsize=4)
+def _get_embedding_model(name: str) -> SentenceTransformer:
+    """
+    Load a sentence-transformers model once per process; encode() is thread-safe.
+    
+    With USE_ONNX=1 the model runs on ONNX Runtime with INT8 weights, exported
+    and quantized into data/onnx/ on first use; otherwise (or if the export
+    fails) it runs on PyTorch, in FP16 on a GPU.
+    """
+    model = None
+    if os.getenv('USE_ONNX') == '1':
+        onnx_dir = Path('data/onnx') / name.replace('/', '_')
+        try:
+            if not (onnx_dir / ONNX_QUANTIZED_FILE).exists():
+                from sentence_transformers import export_dynamic_quantized_onnx_model
+                export = SentenceTransformer(name, backend='onnx')
+                export.save(str(onnx_dir))
+                export_dynamic_quantized_onnx_model(export, 'avx512_vnni', str(onnx_dir))
+            model = SentenceTransformer(
+                str(onnx_dir), backend='onnx', model_kwargs={'file_name': ONNX_QUANTIZED_FILE}
+            )
+        except Exception as e:
+            logger.warning("ONNX export unavailable, using PyTorch model: %s", e)
+    
+    if model is None:
+        # Picks the GPU when there is one; half precision doubles its matmul throughput
+        model = SentenceTransformer(name)
+        if torch.cuda.is_available():
+            model.half()
+    # Page ordering only needs the gist of each page
+    model.max_seq_length = min(model.max_seq_length or EMBEDDING_MAX_TOKENS, EMBEDDING_MAX_TOKENS)
+    return model
+
+
+@functools.lru_cache(maxsize=4)
+def _get_llm_agent(model: str) -> LLMAgent:
+    """Share one LLMAgent (and its HTTP clients) per model across agents."""
+    return LLMAgent(model=model)
+
 
 class PageOrderingAgent:
     """
@@ -29,19 +156,68 @@ class PageOrderingAgent:
     3. Heuristics for edge cases (title pages, table of contents, etc.)
     """
     
-    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2"):
+    # Up to this many non-empty pages, every ordering is scored instead of asking the LLM
+    EXHAUSTIVE_ORDER_MAX_PAGES = 6
+    
+    # Above that, the LLM is skipped when the transition path is this clear-cut:
+    # mean gap between each page's best and second-best successor, or mean path score
+    CONFIDENT_MARGIN = 0.15
+    CONFIDENT_MEAN_SCORE = 0.75
+    
+    # The input order is only kept when consecutive pages are this much more similar
+    # than pages are on average, so a shuffled single-topic document does not qualify
+    PRESORTED_MARGIN = 0.1
+    
+    # Section keyword pairs that indicate one page flows into the next
+    FLOW_INDICATORS = (
+        # First page indicators
+        ('executive summary', 'problem statement'),
+        ('introduction', 'methodology'),
+        ('problem statement', 'solution'),
+        ('abstract', 'introduction'),
+        # Sequential indicators
+        ('section 1', 'section 2'),
+        ('part i', 'part ii'),
+        ('chapter 1', 'chapter 2'),
+        # Conclusion indicators
+        ('conclusion', 'references'),
+        ('summary', 'references'),
+    )
+    FLOW_KEYWORDS = tuple(dict.fromkeys(keyword for pair in FLOW_INDICATORS for keyword in pair))
+    
+    # Title/intro page keywords and their weights when found near the top of a page
+    START_PAGE_KEYWORDS = (
+        ('LOAN AGREEMENT', 15),
+        ('DEFINITIONS', 10),
+    )
+    
+    # Phrases referring back to earlier sections, typical of middle pages
+    MIDDLE_PAGE_PHRASES = ('AS SET FORTH', 'AS PROVIDED', 'PURSUANT TO')
+    
+    ROMAN_NUMERALS = {
+        'i': 1, 'ii': 2, 'iii': 3, 'iv': 4, 'v': 5, 'vi': 6, 'vii': 7, 'viii': 8, 'ix': 9, 'x': 10,
+        'xi': 11, 'xii': 12, 'xiii': 13, 'xiv': 14, 'xv': 15, 'xvi': 16, 'xvii': 17, 'xviii': 18,
+        'xix': 19, 'xx': 20
+    }
+    
+    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2", presorted_threshold: float = 0.75):
         """
         Initialize the Page Ordering Agent.
         
         Args:
             embedding_model: Sentence transformer model for embeddings
+            presorted_threshold: Mean similarity between consecutive input pages above
+                which the input order is kept without consulting the LLM, provided it
+                also beats the mean similarity of all page pairs by PRESORTED_MARGIN
         """
+        self.presorted_threshold = presorted_threshold
         try:
-            self.embedding_model = SentenceTransformer(embedding_model)
-            self.llm_agent = LLMAgent(model="llama3:latest")
-            logger.info(f"✅ PageOrderingAgent initialized with {embedding_model}")
+            self.embedding_model_name = embedding_model
+            self.embedding_model = _get_embedding_model(embedding_model)
+            self.llm_agent = _get_llm_agent("llama3:latest")
+            logger.info("✅ PageOrderingAgent initialized with %s", embedding_model)
         except Exception as e:
-            logger.error(f"Failed to initialize PageOrderingAgent: {e}")
+            logger.error("Failed to initialize PageOrderingAgent: %s", e)
             raise
     
     def determine_page_order(
@@ -69,7 +245,7 @@ class PageOrderingAgent:
                 - reasoning: LLM reasoning for the order
         """
         try:
-            logger.info(f"🧠 Determining page order for {len(pages)} pages")
+            logger.info("🧠 Determining page order for %s pages", len(pages))
             
             # Filter out empty pages but keep track of them
             non_empty_pages = [p for p in pages if not p.get('is_empty', False)]
@@ -87,11 +263,12 @@ class PageOrderingAgent:
             
             # Step 1: Create embeddings for all pages
             logger.info("📊 Creating semantic embeddings for pages...")
-            page_texts = [p.get('text', '')[:2000] for p in non_empty_pages]  # Limit to 2000 chars per page
-            embeddings = self.embedding_model.encode(page_texts, show_progress_bar=False)
+            page_texts = [p.get('text', '')[:EMBEDDING_TEXT_CHARS] for p in non_empty_pages]
+            embeddings = self._encode_pages(page_texts)
             
-            # Step 2: Calculate similarity matrix
-            similarity_matrix = cosine_similarity(embeddings)
+            # Step 2: Calculate similarity matrix (embeddings are unit length, so cosine is a dot product)
+            similarity_matrix = embeddings @ embeddings.T
+            np.fill_diagonal(similarity_matrix, 0.0)
             
             # Step 3: Use embeddings to find likely page transitions
             transition_scores = self._calculate_transition_scores(
@@ -101,30 +278,44 @@ class PageOrderingAgent:
             )
             
             # Log original page order for debugging
-            original_page_numbers = [p['page_number'] for p in non_empty_pages]
-            logger.info(f"📋 Original page numbers in input: {original_page_numbers}")
-            logger.info(f"📋 Original indices (0-based): {list(range(len(non_empty_pages)))}")
-            
-            # Step 4: Use LLM to determine logical order
-            logger.info("🤖 Using LLM to determine logical page order...")
-            llm_order = self._llm_determine_order(non_empty_pages, transition_scores)
+            if logger.isEnabledFor(logging.INFO):
+                original_page_numbers = [p['page_number'] for p in non_empty_pages]
+                logger.info("📋 Original page numbers in input: %s", original_page_numbers)
+                logger.info("📋 Original indices (0-based): %s", list(range(len(non_empty_pages))))
+            
+            # Step 4: Use LLM to determine logical order (small documents are solved
+            # exactly from the transition scores, skipping the LLM round-trip)
+            if len(non_empty_pages) <= self.EXHAUSTIVE_ORDER_MAX_PAGES:
+                logger.info("🔢 Scoring every possible page order...")
+                llm_order = self._exhaustive_order(transition_scores)
+            else:
+                llm_order = (
+                    self._presorted_order(similarity_matrix)
+                    or self._confident_transition_order(non_empty_pages, transition_scores)
+                )
+                if llm_order is None:
+                    # Only now is the LLM needed, so only now is it queried
+                    logger.info("🤖 Using LLM to determine logical page order...")
+                    llm_order = self._llm_determine_order(non_empty_pages, transition_scores)
             
             llm_order_indices = llm_order.get('order', [])
-            logger.info(f"🤖 LLM returned order (indices): {llm_order_indices}")
-            if llm_order_indices:
+            logger.info("🤖 LLM returned order (indices): %s", llm_order_indices)
+            if llm_order_indices and logger.isEnabledFor(logging.INFO):
                 llm_page_numbers = [non_empty_pages[i]['page_number'] for i in llm_order_indices if 0 <= i < len(non_empty_pages)]
-                logger.info(f"🤖 LLM order (page numbers): {llm_page_numbers}")
+                logger.info("🤖 LLM order (page numbers): %s", llm_page_numbers)
             
             # Step 5: Combine embeddings and LLM results
-            final_order = self._combine_ordering_results(
+            order_indices = self._combine_ordering_results(
                 non_empty_pages,
                 llm_order,
                 transition_scores
             )
+            final_order = [non_empty_pages[i] | {'original_index': int(i)} for i in order_indices]
             
             # Log what we got after combining
-            final_page_numbers = [p['page_number'] for p in final_order]
-            logger.info(f"📋 Final order after combining (page numbers): {final_page_numbers}")
+            if logger.isEnabledFor(logging.INFO):
+                final_page_numbers = [p['page_number'] for p in final_order]
+                logger.info("📋 Final order after combining (page numbers): %s", final_page_numbers)
             
             # Step 6: Reinsert empty pages at their original positions
             final_pages_with_empty = self._reinsert_empty_pages(
@@ -150,8 +341,8 @@ class PageOrderingAgent:
             original_order = [p['page_number'] for p in pages]
             
             # Log the actual reordering
-            logger.info(f"✅ Page order determined: {page_order}")
-            logger.info(f"   Original order: {original_order}")
+            logger.info("✅ Page order determined: %s", page_order)
+            logger.info("   Original order: %s", original_order)
             
             # Check if order actually changed
             if page_order == original_order:
@@ -159,9 +350,9 @@ class PageOrderingAgent:
                 # Try to detect if pages are actually jumbled by checking if LLM returned different order
                 llm_order_indices = llm_order.get('order', list(range(len(non_empty_pages))))
                 if llm_order_indices != list(range(len(non_empty_pages))):
-                    logger.warning(f"   LLM suggested different order: {llm_order_indices}, but final order is unchanged")
+                    logger.warning("   LLM suggested different order: %s, but final order is unchanged", llm_order_indices)
             else:
-                logger.info(f"   ✅ Order changed: {original_order} -> {page_order}")
+                logger.info("   ✅ Order changed: %s -> %s", original_order, page_order)
             
             return {
                 'success': True,
@@ -175,7 +366,7 @@ class PageOrderingAgent:
             }
             
         except Exception as e:
-            logger.error(f"Error determining page order: {e}", exc_info=True)
+            logger.error("Error determining page order: %s", e, exc_info=True)
             return {
                 'success': False,
                 'error': str(e),
@@ -184,289 +375,186 @@ class PageOrderingAgent:
                 'confidence_scores': [0.5] * len(pages)
             }
     
+    def _encode_pages(self, page_texts: List[str]) -> np.ndarray:
+        """
+        Embed page texts as unit-length float32 vectors.
+        
+        Pages seen recently (retries, re-uploads) come from an in-process LRU
+        cache; only the misses are encoded. encode() already sorts inputs by
+        length and pads each mini-batch to its longest member, so the texts are
+        passed through in their original order.
+        """
+        keys = [
+            (self.embedding_model_name, hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest())
+            for text in page_texts
+        ]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        with _embedding_cache_lock:
+            for i, key in enumerate(keys):
+                vectors[i] = _embedding_cache.get(key)
+                if vectors[i] is not None:
+                    _embedding_cache.move_to_end(key)
+        
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = self.embedding_model.encode(
+                [page_texts[i] for i in missing],
+                batch_size=32,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            ).astype(np.float32, copy=False)
+            with _embedding_cache_lock:
+                for i, vector in zip(missing, encoded):
+                    # Copy the row so the cache doesn't pin the whole batch array
+                    vectors[i] = vector.copy()
+                    _embedding_cache[keys[i]] = vectors[i]
+                    _embedding_cache.move_to_end(keys[i])
+                while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+                    _embedding_cache.popitem(last=False)
+        
+        logger.debug("Page embeddings: %s cached, %s encoded", len(keys) - len(missing), len(missing))
+        return np.stack(vectors)
+    
     def _calculate_transition_scores(
         self,
         pages: List[Dict],
         embeddings: np.ndarray,
         similarity_matrix: np.ndarray
-    ) -> Dict[Tuple[int, int], float]:
+    ) -> np.ndarray:
         """
         Calculate scores for potential page transitions.
         
-        Higher scores indicate more likely sequential pages.
+        Returns an (N, N) float32 matrix where entry [i, j] scores page i being
+        directly followed by page j. Higher scores indicate more likely sequential
+        pages; the diagonal is zero.
         """
-        transition_scores = {}
-        
-        for i in range(len(pages)):
-            for j in range(len(pages)):
-                if i != j:
-                    # Use semantic similarity as base
-                    semantic_score = similarity_matrix[i][j]
-                    
-                    # Boost score if pages seem to flow together
-                    # (e.g., one page ends with a question, next starts with answer)
-                    text_i = pages[i].get('text', '')[:500]  # First 500 chars
-                    text_j = pages[j].get('text', '')[:500]  # First 500 chars
-                    
-                    flow_score = self._calculate_flow_score(text_i, text_j)
-                    
-                    # Combined score
-                    transition_scores[(i, j)] = (semantic_score * 0.6) + (flow_score * 0.4)
+        # Use semantic similarity as base, boosted where pages seem to flow together
+        # (e.g., one page ends with a question, next starts with answer)
+        flow_matrix = self._calculate_flow_matrix(pages)
+        transition_scores = (np.asarray(similarity_matrix, dtype=np.float32) * 0.6) + (flow_matrix * 0.4)
+        np.fill_diagonal(transition_scores, 0.0)
         
         return transition_scores
     
-    def _calculate_flow_score(self, text_before: str, text_after: str) -> float:
-        """Calculate how well text_before flows into text_after."""
-        if not text_before or not text_after:
-            return 0.0
-        
-        # Simple heuristics for flow
-        text_before_lower = text_before.lower().strip()
-        text_after_lower = text_after.lower().strip()
-        
-        # Check for continuation patterns
-        flow_indicators = [
-            # First page indicators
-            ('executive summary', 'problem statement'),
-            ('introduction', 'methodology'),
-            ('problem statement', 'solution'),
-            ('abstract', 'introduction'),
-            # Sequential indicators
-            ('section 1', 'section 2'),
-            ('part i', 'part ii'),
-            ('chapter 1', 'chapter 2'),
-            # Conclusion indicators
-            ('conclusion', 'references'),
-            ('summary', 'references'),
-        ]
-        
-        for pattern_before, pattern_after in flow_indicators:
-            if pattern_before in text_before_lower and pattern_after in text_after_lower:
-                return 0.8
-        
-        # Check for Roman numeral sequences (Article I, II, III, etc.)
-        import re
-        roman_before = re.findall(r'\b(article|part|chapter)\s+([ivxlcdm]+)\b', text_before[:200], re.IGNORECASE)
-        roman_after = re.findall(r'\b(article|part|chapter)\s+([ivxlcdm]+)\b', text_after[:200], re.IGNORECASE)
-        
-        if roman_before and roman_after:
-            # Simple check: if we see Article I before and Article II after, that's good flow
-            try:
-                roman_numerals = {'i': 1, 'ii': 2, 'iii': 3, 'iv': 4, 'v': 5, 'vi': 6, 'vii': 7, 'viii': 8, 'ix': 9, 'x': 10}
-                last_roman = roman_before[-1][1].lower()
-                first_roman = roman_after[0][1].lower()
-                if last_roman in roman_numerals and first_roman in roman_numerals:
-                    if roman_numerals[first_roman] == roman_numerals[last_roman] + 1:
-                        return 0.7
-            except:
-                pass
-        
-        # Check for clause numbering sequences (i), ii), iii), etc. or 1), 2), 3), etc.
-        clause_before = re.findall(r'([ivxlcdm]+)\)|(\d+)\)', text_before[:300], re.IGNORECASE)
-        clause_after = re.findall(r'([ivxlcdm]+)\)|(\d+)\)', text_after[:300], re.IGNORECASE)
-        
-        if clause_before and clause_after:
-            try:
-                # Get the last clause number from before
-                last_clause = None
-                for match in clause_before:
-                    if match[0]:  # Roman numeral
-                        last_clause = match[0].lower()
-                    elif match[1]:  # Arabic number
-                        last_clause = int(match[1])
-                
-                # Get the first clause number from after
-                first_clause = None
-                for match in clause_after:
-                    if match[0]:  # Roman numeral
-                        first_clause = match[0].lower()
-                    elif match[1]:  # Arabic number
-                        first_clause = int(match[1])
-                
-                if last_clause and first_clause:
-                    if isinstance(last_clause, str) and isinstance(first_clause, str):
-                        # Both are Roman numerals
-                        roman_numerals = {'i': 1, 'ii': 2, 'iii': 3, 'iv': 4, 'v': 5, 'vi': 6, 'vii': 7, 'viii': 8, 'ix': 9, 'x': 10, 'xi': 11, 'xii': 12, 'xiii': 13, 'xiv': 14, 'xv': 15, 'xvi': 16, 'xvii': 17, 'xviii': 18, 'xix': 19, 'xx': 20}
-                        if last_clause in roman_numerals and first_clause in roman_numerals:
-                            if roman_numerals[first_clause] == roman_numerals[last_clause] + 1:
-                                return 0.75
-                    elif isinstance(last_clause, int) and isinstance(first_clause, int):
-                        # Both are Arabic numbers
-                        if first_clause == last_clause + 1:
-                            return 0.7
-            except:
-                pass
-        
-        # Check for numbering sequences
-        numbers_before = re.findall(r'\b(\d+)\b', text_before[:100])
-        numbers_after = re.findall(r'\b(\d+)\b', text_after[:100])
-        
-        if numbers_before and numbers_after:
-            try:
-                last_num_before = int(numbers_before[-1])
-                first_num_after = int(numbers_after[0])
-                if first_num_after == last_num_before + 1:
-                    return 0.6
-            except:
-                pass
+    def _calculate_flow_matrix(self, pages: List[Dict]) -> np.ndarray:
+        """
+        Calculate how well each page flows into every other page.
         
-        return 0.3  # Default flow score
+        Every page is scanned once for its flow signals; the pairwise checks are
+        then done with NumPy masks. Entry [i, j] scores page i flowing into page j.
+        Each signal looks at a prefix of the page head, passed to the regexes as an
+        end offset rather than a fresh slice.
+        """
+        n = len(pages)
+        heads = [p.get('text', '')[:500] for p in pages]  # First 500 chars
+        heads_lower = [head.lower() for head in heads]
+        
+        # Section keyword pairs (e.g. 'introduction' followed by 'methodology'):
+        # look each distinct keyword up once per page, then pick the pair columns
+        keyword_column = {keyword: k for k, keyword in enumerate(self.FLOW_KEYWORDS)}
+        present = np.array(
+            [[keyword in head for keyword in self.FLOW_KEYWORDS] for head in heads_lower],
+            dtype=np.int32
+        )
+        has_before = present[:, [keyword_column[before] for before, _ in self.FLOW_INDICATORS]]
+        has_after = present[:, [keyword_column[after] for _, after in self.FLOW_INDICATORS]]
+        keyword_mask = (has_before @ has_after.T) > 0
+        
+        # First and last numbering signals per page; 0 means "no usable value"
+        article_first = np.zeros(n, dtype=np.int64)
+        article_last = np.zeros(n, dtype=np.int64)
+        clause_roman_first = np.zeros(n, dtype=np.int64)
+        clause_roman_last = np.zeros(n, dtype=np.int64)
+        clause_number_first = np.zeros(n, dtype=np.int64)
+        clause_number_last = np.zeros(n, dtype=np.int64)
+        number_first = np.zeros(n, dtype=np.int64)
+        number_last = np.zeros(n, dtype=np.int64)
+        has_number = np.zeros(n, dtype=bool)
+        
+        # Cheap substring checks decide whether a page can match a pattern at all,
+        # so most pages never run the article and clause regexes
+        for k, (head, head_lower) in enumerate(zip(heads, heads_lower)):
+            # Roman numeral sequences (Article I, II, III, etc.)
+            if any(word in head_lower for word in ('article', 'part', 'chapter')):
+                articles = _ROMAN_RE.findall(head, 0, 200)
+                if articles:
+                    article_first[k] = self._roman_value(articles[0][1], limit=10)
+                    article_last[k] = self._roman_value(articles[-1][1], limit=10)
+            
+            # Clause numbering sequences (i), ii), iii), etc. or 1), 2), 3), etc.
+            clauses = _CLAUSE_RE.findall(head, 0, 300) if head.find(')', 0, 300) >= 0 else None
+            if clauses:
+                clause_roman_first[k], clause_number_first[k] = self._clause_value(clauses[0])
+                clause_roman_last[k], clause_number_last[k] = self._clause_value(clauses[-1])
+            
+            # Plain numbering sequences
+            numbers = _NUM_RE.findall(head, 0, 100)
+            if numbers:
+                first, last = self._int_value(numbers[0]), self._int_value(numbers[-1])
+                if first is not None and last is not None:
+                    number_first[k], number_last[k] = first, last
+                    has_number[k] = True
+        
+        def follows(last: np.ndarray, first: np.ndarray) -> np.ndarray:
+            return (last[:, None] > 0) & (first[None, :] == last[:, None] + 1)
+        
+        # Apply signals from lowest to highest priority so stronger ones win
+        flow_matrix = np.full((n, n), 0.3, dtype=np.float32)  # Default flow score
+        flow_matrix[
+            has_number[:, None] & has_number[None, :]
+            & (number_first[None, :] == number_last[:, None] + 1)
+        ] = 0.6
+        flow_matrix[follows(clause_number_last, clause_number_first)] = 0.7
+        flow_matrix[follows(clause_roman_last, clause_roman_first)] = 0.75
+        flow_matrix[follows(article_last, article_first)] = 0.7
+        flow_matrix[keyword_mask] = 0.8
+        
+        is_empty = np.array([not head for head in heads], dtype=bool)
+        flow_matrix[is_empty[:, None] | is_empty[None, :]] = 0.0
+        
+        return flow_matrix
+    
+    def _roman_value(self, numeral: str, limit: int = 20) -> int:
+        """Value of a small roman numeral, or 0 if it is not recognised."""
+        value = self.ROMAN_NUMERALS.get(numeral.lower(), 0)
+        return value if value <= limit else 0
+    
+    def _clause_value(self, match: Tuple[str, str]) -> Tuple[int, int]:
+        """Split a clause regex match into (roman value, arabic value), 0 where absent."""
+        roman, number = match
+        if roman:
+            return self._roman_value(roman), 0
+        return 0, self._int_value(number) or 0
+    
+    @staticmethod
+    def _int_value(digits: str) -> Optional[int]:
+        """Parse a run of digits, ignoring ones too long to be a page or section number."""
+        if len(digits) > 18:
+            return None
+        return int(digits)
     
     def _llm_determine_order(
         self,
         pages: List[Dict],
-        transition_scores: Dict[Tuple[int, int], float]
+        transition_scores: np.ndarray
     ) -> Dict[str, Any]:
         """Use LLM to determine logical page order."""
         try:
-            # Prepare page summaries for LLM
-            page_summaries = []
-            for i, page in enumerate(pages):
-                text = page.get('text', '')[:500]  # First 500 chars
-                page_summaries.append({
-                    'index': i,
-                    'page_number': page['page_number'],
-                    'summary': text[:200] + '...' if len(text) > 200 else text,
-                    'first_words': text[:50] if text else ''
-                })
-            
-            # Create prompt for LLM
-            prompt = (
-                "You are an AI assistant that reorders JUMBLED PDF pages.\n"
-                "IMPORTANT: The pages below are OUT OF ORDER and need to be reordered.\n"
-                "Do NOT assume they are already in the correct order - analyze the content carefully.\n\n"
-                "Analyze the following pages and determine their correct logical order.\n"
-                "Consider:\n"
-                "- Title pages and table of contents typically come first\n"
-                "- Introduction/Executive Summary comes before main content\n"
-                "- Sections should follow a logical sequence (Article I, Article II, etc.)\n"
-                "- Sequential numbering or references indicate order\n"
-                "- Conclusion/Summary comes at the end\n"
-                "- References/Appendices come last\n"
-                "- For loan agreements: Title page → Definitions → Terms → Conditions → Signatures\n\n"
-                "Pages to reorder (these are CURRENTLY OUT OF ORDER):\n"
-            )
-            
-            for summary in page_summaries:
-                text_preview = summary['summary'][:400]  # Show more text for better analysis
-                # Show first few lines to help identify content
-                lines = text_preview.split('\n')[:5]
-                content_preview = '\n'.join(lines)
-                prompt += f"\n[Index {summary['index']}] Page {summary['page_number']}:\n"
-                prompt += f"{content_preview}\n"
-                prompt += f"---\n"
-            
-            prompt += (
-                "\n\n" + "="*80 + "\n"
-                "CRITICAL INSTRUCTIONS:\n"
-                "="*80 + "\n"
-                "These pages are DEFINITELY JUMBLED and OUT OF ORDER.\n"
-                "The PDF was scanned/merged incorrectly, so the page sequence is wrong.\n"
-                "You MUST analyze the CONTENT of each page to determine the correct order.\n\n"
-                "DO NOT assume pages are in order just because their indices are sequential.\n"
-                "DO NOT return [0, 1, 2, 3...] - that would mean no reordering is needed.\n\n"
-                "ANALYZE EACH PAGE'S CONTENT for:\n"
-                "1. Title/Header text (e.g., 'LOAN AGREEMENT', 'ARTICLE I', 'DEFINITIONS')\n"
-                "2. Section numbers or references (e.g., 'Article I' should come before 'Article II')\n"
-                "3. Sequential content (e.g., definitions before terms, terms before conditions)\n"
-                "4. Page numbers mentioned in the text itself\n"
-                "5. Logical flow (introduction → main content → conclusion)\n\n"
-                "For loan agreements, typical order is:\n"
-                "1. Title page (LOAN AGREEMENT BETWEEN...)\n"
-                "2. Definitions section\n"
-                "3. Terms and conditions\n"
-                "4. Specific clauses (Article I, II, III...)\n"
-                "5. Signatures/Appendices\n\n"
-                "You must respond with ONLY valid JSON in this exact format:\n"
-                "{\"order\": [0, 2, 1, 3], \"reasoning\": \"Explanation here\"}\n"
-                "Where 'order' is an array of page indices (0-based) in the correct sequence.\n"
-                "Example: [0, 2, 1, 3] means:\n"
-                "  - First: page at index 0\n"
-                "  - Second: page at index 2\n"
-                "  - Third: page at index 1\n"
-                "  - Fourth: page at index 3\n"
-                "The 'order' array must contain ALL page indices from 0 to " + str(len(pages) - 1) + " exactly once.\n"
-                "If you return [0, 1, 2, 3...], you are saying pages are already in order - ONLY do this if you are 100% certain.\n"
-                "Do not include any text before or after the JSON object.\n"
-                "Response:\n"
-            )
-            
             # Query LLM
-            result = self.llm_agent.query(user_prompt=prompt)
+            result = self._query_order_llm(pages)
             
             if not result.get('success'):
-                logger.warning(f"LLM query failed: {result.get('error')}")
+                logger.warning("LLM query failed: %s", result.get('error'))
                 return {'order': list(range(len(pages))), 'reasoning': 'LLM query failed, using original order'}
             
             response = result.get('result', '')
-            logger.debug(f"LLM raw response: {response[:500]}...")
-            
-            # Parse JSON from response
-            import json
-            import re
-            
-            # Try multiple parsing strategies
-            parsed_order = None
-            reasoning = 'Ordering based on logical flow'
-            
-            # Strategy 1: Look for JSON object with "order" field
-            json_patterns = [
-                r'\{[^{}]*"order"\s*:\s*\[[^\]]+\][^{}]*\}',  # JSON with order array
-                r'\{.*?"order"\s*:\s*\[.*?\].*?\}',  # More flexible pattern
-                r'\{.*?\}',  # Any JSON object
-            ]
-            
-            for pattern in json_patterns:
-                json_match = re.search(pattern, response, re.DOTALL | re.IGNORECASE)
-                if json_match:
-                    try:
-                        parsed = json.loads(json_match.group(0))
-                        parsed_order = parsed.get('order')
-                        reasoning = parsed.get('reasoning', reasoning)
-                        if parsed_order:
-                            break
-                    except (json.JSONDecodeError, AttributeError) as e:
-                        logger.debug(f"Failed to parse JSON with pattern {pattern}: {e}")
-                        continue
-            
-            # Strategy 2: Look for array of numbers directly
-            if not parsed_order:
-                array_patterns = [
-                    r'\[[\s\d,]+\]',  # Simple array like [0, 1, 2, 3]
-                    r'order\s*[:=]\s*\[[\s\d,]+\]',  # order: [0, 1, 2, 3]
-                ]
-                
-                for pattern in array_patterns:
-                    array_match = re.search(pattern, response, re.IGNORECASE)
-                    if array_match:
-                        try:
-                            # Extract the array part
-                            array_str = array_match.group(0)
-                            if ':' in array_str or '=' in array_str:
-                                array_str = array_str.split(':', 1)[-1].split('=', 1)[-1].strip()
-                            parsed_order = json.loads(array_str)
-                            if isinstance(parsed_order, list) and len(parsed_order) == len(pages):
-                                break
-                        except (json.JSONDecodeError, ValueError) as e:
-                            logger.debug(f"Failed to parse array: {e}")
-                            continue
-            
-            # Strategy 3: Extract reasoning even if order not found
-            reasoning_match = re.search(r'reasoning["\']?\s*[:=]\s*["\']?([^"\']+)["\']?', response, re.IGNORECASE)
-            if reasoning_match:
-                reasoning = reasoning_match.group(1).strip()
+            logger.debug("LLM raw response: %.500s...", response)
             
-            # Validate and return order
-            if parsed_order and isinstance(parsed_order, list):
-                # Convert to integers if needed
-                try:
-                    parsed_order = [int(x) for x in parsed_order]
-                    # Validate order
-                    if len(parsed_order) == len(pages) and set(parsed_order) == set(range(len(pages))):
-                        logger.info(f"✅ Successfully parsed LLM order: {parsed_order}")
-                        return {'order': parsed_order, 'reasoning': reasoning}
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Invalid order format: {e}")
+            parsed_order, reasoning = self._parse_llm_order(response, len(pages))
+            if parsed_order is not None:
+                logger.info("✅ Successfully parsed LLM order: %s", parsed_order)
+                return {'order': parsed_order, 'reasoning': reasoning or 'Ordering based on logical flow'}
             
             # Fallback: use embedding-based ordering with better algorithm
             logger.warning("Could not parse LLM response, using embedding-based ordering")
@@ -475,185 +563,332 @@ class PageOrderingAgent:
             return {'order': embedding_order, 'reasoning': 'LLM response not parseable, using embedding similarity analysis'}
             
         except Exception as e:
-            logger.error(f"Error in LLM ordering: {e}", exc_info=True)
+            logger.error("Error in LLM ordering: %s", e, exc_info=True)
             return {'order': list(range(len(pages))), 'reasoning': f'Error: {str(e)}'}
     
+    def _parse_llm_order(self, response: str, n: int) -> Tuple[Optional[List[int]], Optional[str]]:
+        """
+        Extract the page order and reasoning from an LLM response.
+        
+        Every '{' or '[' offset is tried with JSONDecoder.raw_decode, so nested
+        braces inside the reasoning are handled. The first object with an
+        'order' array (or bare array) that is a permutation of range(n) wins.
+        """
+        order = None
+        reasoning = None
+        match = _JSON_START_RE.search(response)
+        while match:
+            start = match.start()
+            try:
+                value, _ = _JSON_DECODER.raw_decode(response, start)
+            except ValueError:
+                value = None
+            
+            if isinstance(value, dict):
+                if reasoning is None and isinstance(value.get('reasoning'), str):
+                    reasoning = value['reasoning']
+                value = value.get('order')
+            order = self._as_permutation(value, n)
+            if order is not None:
+                break
+            
+            # Keep scanning inside this value too, e.g. {"result": {"order": [...]}}
+            match = _JSON_START_RE.search(response, start + 1)
+        
+        # Extract reasoning even if no JSON object carried it
+        if reasoning is None:
+            reasoning_match = _REASONING_RE.search(response)
+            if reasoning_match:
+                reasoning = reasoning_match.group(1).strip()
+        
+        return order, reasoning
+    
+    @staticmethod
+    def _as_permutation(value: Any, n: int) -> Optional[List[int]]:
+        """Return value as a list of ints if it is a permutation of range(n), else None."""
+        if not isinstance(value, list) or len(value) != n:
+            return None
+        try:
+            order = np.asarray([int(x) for x in value], dtype=np.int64)
+        except (ValueError, TypeError, OverflowError):
+            return None
+        if n == 0:
+            return []
+        if order.min() != 0 or order.max() != n - 1 or np.bincount(order, minlength=n).max() != 1:
+            return None
+        return order.tolist()
+    
+    def _exhaustive_order(self, transition_scores: np.ndarray) -> Dict[str, Any]:
+        """Find the page order with the highest total transition score by trying them all."""
+        n = len(transition_scores)
+        orders = np.array(list(itertools.permutations(range(n))))
+        totals = transition_scores[orders[:, :-1], orders[:, 1:]].sum(axis=1)
+        return {
+            'order': orders[int(totals.argmax())].tolist(),
+            'reasoning': 'Highest-scoring order among all page permutations (semantic similarity and flow)',
+            'from_transitions': True
+        }
+    
+    def _presorted_order(self, similarity_matrix: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Keep the input order when consecutive pages are already strongly similar.
+        
+        High adjacent similarity alone is not enough: in a single-topic document
+        every pair of pages is similar, shuffled or not. Consecutive pages must
+        also stand out against the mean similarity of all page pairs.
+        """
+        n = len(similarity_matrix)
+        adjacent_similarity = float(np.diag(similarity_matrix, k=1).mean())
+        # The diagonal is zeroed, so the off-diagonal mean is the total over n*(n-1)
+        baseline_similarity = float(similarity_matrix.sum()) / (n * (n - 1))
+        if (adjacent_similarity <= self.presorted_threshold
+                or adjacent_similarity - baseline_similarity <= self.PRESORTED_MARGIN):
+            return None
+        
+        logger.info(
+            "⚡ Pages look already ordered (adjacent similarity %.3f vs %.3f overall), skipping LLM",
+            adjacent_similarity, baseline_similarity
+        )
+        return {
+            'order': list(range(len(similarity_matrix))),
+            'reasoning': 'Consecutive pages are already semantically continuous; original order kept',
+            'from_transitions': True
+        }
+    
+    def _confident_transition_order(
+        self,
+        pages: List[Dict],
+        transition_scores: np.ndarray
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the transition-score path when it is unambiguous enough to skip the LLM.
+        
+        The path is trusted when each page's best successor clearly beats its
+        runner-up on average, or when the path's mean transition score is high.
+        """
+        n = len(transition_scores)
+        path = self._create_path_from_transitions(pages, transition_scores)
+        mean_score = float(transition_scores[path[:-1], path[1:]].mean())
+        
+        off_diagonal = transition_scores.copy()
+        np.fill_diagonal(off_diagonal, -np.inf)
+        top_two = np.partition(off_diagonal, n - 2, axis=1)[:, -2:]
+        margin = float((top_two[:, 1] - top_two[:, 0]).mean())
+        
+        if margin <= self.CONFIDENT_MARGIN and mean_score <= self.CONFIDENT_MEAN_SCORE:
+            logger.info("Transition scores ambiguous (margin %.3f, mean %.3f), asking LLM", margin, mean_score)
+            return None
+        
+        logger.info("⚡ Transition scores unambiguous (margin %.3f, mean %.3f), skipping LLM", margin, mean_score)
+        return {
+            'order': path,
+            'reasoning': 'Clear page-to-page transitions from semantic similarity and flow',
+            'from_transitions': True
+        }
+    
+    def _query_order_llm(self, pages: List[Dict]) -> Dict[str, Any]:
+        """Ask the LLM for the page order; returns the raw LLMAgent.query result."""
+        return self.llm_agent.query(user_prompt=self._build_order_prompt(pages))
+    
+    def _build_order_prompt(self, pages: List[Dict]) -> str:
+        """Build the LLM prompt listing a short preview of every page."""
+        parts = [ORDER_PROMPT_HEADER]
+        for i, page in enumerate(pages):
+            text = page.get('text', '')
+            preview = text[:200] + '...' if len(text) > 200 else text
+            # Show first few lines to help identify content
+            content_preview = '\n'.join(preview.split('\n', 5)[:5])
+            parts.append(f"\n[Index {i}] Page {page['page_number']}:\n{content_preview}\n---\n")
+        parts.append(ORDER_PROMPT_FOOTER.format(last_index=len(pages) - 1))
+        return ''.join(parts)
+    
     def _combine_ordering_results(
         self,
         pages: List[Dict],
         llm_order: Dict,
-        transition_scores: Dict[Tuple[int, int], float]
-    ) -> List[Dict]:
-        """Combine LLM ordering with embedding-based scores."""
+        transition_scores: np.ndarray
+    ) -> np.ndarray:
+        """Combine LLM ordering with embedding-based scores (returns array of page indices)."""
         llm_order_indices = llm_order.get('order', list(range(len(pages))))
         
-        logger.info(f"🔄 Applying LLM order: {llm_order_indices}")
+        logger.info("🔄 Applying LLM order: %s", llm_order_indices)
         
         # Check if LLM returned original order (which might indicate it didn't reorder)
-        if llm_order_indices == list(range(len(pages))):
+        if llm_order_indices == list(range(len(pages))) and not llm_order.get('from_transitions'):
             logger.warning("⚠️  LLM returned original order [0, 1, 2, ...] - pages may not be reordered")
             logger.info("   Trying embedding-based ordering as alternative...")
             # Try embedding-based ordering instead
             embedding_order = self._create_embedding_based_order(pages, transition_scores)
             if embedding_order != list(range(len(pages))):
-                logger.info(f"   Embedding-based order: {embedding_order}")
+                logger.info("   Embedding-based order: %s", embedding_order)
                 llm_order_indices = embedding_order
             else:
                 logger.warning("   Embedding-based order also returned original order")
         
-        # Validate and create ordered pages
-        ordered_pages = []
-        seen_indices = set()
+        # Validate the order
+        ordered_indices = []
+        seen = np.zeros(len(pages), dtype=bool)
         for idx in llm_order_indices:
             if 0 <= idx < len(pages):
-                if idx in seen_indices:
-                    logger.warning(f"⚠️  Duplicate index {idx} in LLM order, skipping")
+                if seen[idx]:
+                    logger.warning("⚠️  Duplicate index %s in LLM order, skipping", idx)
                     continue
-                seen_indices.add(idx)
-                page_copy = pages[idx].copy()
-                page_copy['original_index'] = idx
-                ordered_pages.append(page_copy)
+                seen[idx] = True
+                ordered_indices.append(idx)
         
         # If LLM order is invalid or incomplete, use transition scores to create a path
-        if len(ordered_pages) != len(pages):
-            logger.warning(f"⚠️  LLM order incomplete ({len(ordered_pages)}/{len(pages)} pages), using transition scores")
-            ordered_pages = self._create_path_from_transitions(pages, transition_scores)
+        if len(ordered_indices) != len(pages):
+            logger.warning("⚠️  LLM order incomplete (%s/%s pages), using transition scores", len(ordered_indices), len(pages))
+            ordered_indices = self._create_path_from_transitions(pages, transition_scores)
         
         # Log the final order
-        final_page_nums = [p['page_number'] for p in ordered_pages]
-        logger.info(f"✅ Final ordered page numbers: {final_page_nums}")
+        if logger.isEnabledFor(logging.INFO):
+            final_page_nums = [pages[i]['page_number'] for i in ordered_indices]
+            logger.info("✅ Final ordered page numbers: %s", final_page_nums)
         
-        return ordered_pages
+        return np.asarray(ordered_indices, dtype=np.int32)
     
     def _create_path_from_transitions(
         self,
         pages: List[Dict],
-        transition_scores: Dict[Tuple[int, int], float]
-    ) -> List[Dict]:
-        """Create an ordering path using transition scores (greedy path finding)."""
+        transition_scores: np.ndarray
+    ) -> List[int]:
+        """Create an ordering path using transition scores (greedy path plus 2-opt; returns list of indices)."""
         if not pages:
             return []
         
         # Start with page that has highest outgoing transition scores
         # (likely a beginning page)
-        start_page = 0
-        max_outgoing = sum(
-            transition_scores.get((0, j), 0) for j in range(len(pages))
-        )
+        start_page = int(transition_scores.sum(axis=1).argmax())
         
-        for i in range(1, len(pages)):
-            outgoing = sum(
-                transition_scores.get((i, j), 0) for j in range(len(pages))
-            )
-            if outgoing > max_outgoing:
-                max_outgoing = outgoing
-                start_page = i
-        
-        # Greedy path: always go to next page with highest transition score
-        ordered_indices = [start_page]
-        remaining = set(range(len(pages))) - {start_page}
-        
-        while remaining:
-            current = ordered_indices[-1]
-            best_next = None
-            best_score = -1
-            
-            for next_idx in remaining:
-                score = transition_scores.get((current, next_idx), 0)
-                if score > best_score:
-                    best_score = score
-                    best_next = next_idx
-            
-            if best_next is not None:
-                ordered_indices.append(best_next)
-                remaining.remove(best_next)
-            else:
-                # No good transition, add remaining pages in order
-                ordered_indices.extend(sorted(remaining))
-                break
-        
-        # Create ordered pages
-        ordered_pages = []
-        for idx in ordered_indices:
-            page_copy = pages[idx].copy()
-            page_copy['original_index'] = idx
-            ordered_pages.append(page_copy)
-        
-        return ordered_pages
+        ordered_indices = self._greedy_path(transition_scores, start_page)
+        return self._two_opt(transition_scores, ordered_indices)
     
     def _create_embedding_based_order(
         self,
         pages: List[Dict],
-        transition_scores: Dict[Tuple[int, int], float]
+        transition_scores: np.ndarray
     ) -> List[int]:
         """Create an ordering based on embedding similarity (returns list of indices)."""
         if not pages or len(pages) <= 1:
             return list(range(len(pages)))
         
         # Find the best starting page (likely a title/intro page)
-        # Look for pages with words like "LOAN AGREEMENT", "ARTICLE - I", "DEFINITIONS", etc.
-        start_candidates = []
-        for i, page in enumerate(pages):
-            text = page.get('text', '').upper()
-            score = 0
-            # Title page indicators (strong signals)
-            if 'LOAN AGREEMENT' in text and 'BETWEEN' in text:
-                score += 20
-            if 'LOAN AGREEMENT' in text:
-                score += 15
-            if 'ARTICLE' in text and ('I' in text[:100] or '1' in text[:100] or 'ONE' in text[:100]):
-                score += 12
-            if 'DEFINITIONS' in text:
-                score += 10
-            if text.startswith('LOAN AGREEMENT'):
-                score += 15
-            # Check for title-like patterns at the start
-            first_lines = text.split('\n')[:3]
-            for line in first_lines:
-                if 'AGREEMENT' in line and len(line) < 100:
-                    score += 8
-                if 'BETWEEN' in line and 'AND' in line:
-                    score += 8
-            # Penalize pages with continuation markers (likely not first page)
-            if text.startswith('-') or text.startswith('...'):
-                score -= 5
-            if 'CONTINUED' in text[:200] or 'CONTINUATION' in text[:200]:
-                score -= 3
-            # Check if page seems like a middle page (mentions previous sections)
-            if any(word in text[:200] for word in ['AS SET FORTH', 'AS PROVIDED', 'PURSUANT TO']):
-                score -= 2
-            
-            start_candidates.append((score, i))
-        
-        # Sort by score and pick the best starting page
-        start_candidates.sort(reverse=True)
-        start_page = start_candidates[0][1] if start_candidates else 0
-        
-        # Build ordering using transition scores
-        ordered_indices = [start_page]
-        remaining = set(range(len(pages))) - {start_page}
-        
-        # Greedy path: always go to next page with highest transition score
-        while remaining:
-            current = ordered_indices[-1]
-            best_next = None
-            best_score = -1
-            
-            for next_idx in remaining:
-                score = transition_scores.get((current, next_idx), 0)
-                if score > best_score:
-                    best_score = score
-                    best_next = next_idx
-            
-            if best_next is not None and best_score > 0.3:  # Only follow if score is reasonable
-                ordered_indices.append(best_next)
-                remaining.remove(best_next)
-            else:
+        scores = np.array([self._start_page_score(page.get('text', '')) for page in pages])
+        start_page = int(scores.argmax())
+        
+        # Build ordering using transition scores, only following reasonable transitions
+        return self._greedy_path(transition_scores, start_page, min_score=0.3)
+    
+    def _start_page_score(self, text: str) -> int:
+        """
+        Score how likely a page is the title/intro page.
+        
+        Looks for words like "LOAN AGREEMENT", "ARTICLE - I", "DEFINITIONS", etc.
+        Only the start of the page is scanned, since that is where these appear.
+        """
+        head = text[:500].upper()
+        start = head[:200]
+        
+        # Title page indicators (strong signals)
+        score = sum(weight for keyword, weight in self.START_PAGE_KEYWORDS if keyword in head)
+        if 'LOAN AGREEMENT' in head and 'BETWEEN' in head:
+            score += 20
+        if head.startswith('LOAN AGREEMENT'):
+            score += 15
+        if 'ARTICLE' in head and any(token in head[:100] for token in ('I', '1', 'ONE')):
+            score += 12
+        # Check for title-like patterns at the start
+        for line in head.split('\n', 3)[:3]:
+            if 'AGREEMENT' in line and len(line) < 100:
+                score += 8
+            if 'BETWEEN' in line and 'AND' in line:
+                score += 8
+        
+        # Penalize pages with continuation markers (likely not first page)
+        if head.startswith(('-', '...')):
+            score -= 5
+        if 'CONTINUED' in start or 'CONTINUATION' in start:
+            score -= 3
+        # Check if page seems like a middle page (mentions previous sections)
+        if any(phrase in start for phrase in self.MIDDLE_PAGE_PHRASES):
+            score -= 2
+        
+        return score
+    
+    def _greedy_path(
+        self,
+        transition_scores: np.ndarray,
+        start: int,
+        min_score: Optional[float] = None
+    ) -> List[int]:
+        """
+        Greedy path: always go to the unvisited page with the highest transition score.
+        
+        If min_score is given and the best transition does not exceed it, the
+        remaining pages are appended in index order instead.
+        """
+        n = len(transition_scores)
+        path = [start]
+        visited = np.zeros(n, dtype=bool)
+        visited[start] = True
+        
+        while len(path) < n:
+            row = np.where(visited, -np.inf, transition_scores[path[-1]])
+            best_next = int(row.argmax())
+            
+            if min_score is not None and row[best_next] <= min_score:
                 # No good transition, add remaining pages in order
-                ordered_indices.extend(sorted(remaining))
+                path.extend(np.flatnonzero(~visited).tolist())
+                break
+            
+            path.append(best_next)
+            visited[best_next] = True
+        
+        return path
+    
+    def _two_opt(self, transition_scores: np.ndarray, path: List[int], max_passes: int = 50) -> List[int]:
+        """
+        Improve a path's total transition score by reversing segments (2-opt).
+        
+        Scores are directional, so reversing path[i..j] also flips every edge
+        inside the segment. Prefix sums of the forward and backward edge scores
+        give the gain of every (i, j) reversal at once; the best one is applied
+        until none improves the path.
+        """
+        n = len(path)
+        if n < 3:
+            return path
+        
+        order = np.asarray(path)
+        upper = np.triu(np.ones((n, n), dtype=bool), k=1)
+        
+        for _ in range(max_passes):
+            # permuted[a, b] = score of path position a followed by position b,
+            # zero-padded so the path ends have no neighbour edge
+            permuted = np.zeros((n + 2, n + 2), dtype=transition_scores.dtype)
+            permuted[1:-1, 1:-1] = transition_scores[np.ix_(order, order)]
+            positions = np.arange(n)
+            
+            forward = np.concatenate(([0.0], np.cumsum(permuted[positions + 1, positions + 2][:-1])))
+            backward = np.concatenate(([0.0], np.cumsum(permuted[positions + 2, positions + 1][:-1])))
+            
+            # Reversing positions i..j: p[i-1] -> p[j] and p[i] -> p[j+1] replace the
+            # old boundary edges, and the inner edges run backwards
+            gain = (
+                permuted[:n, 1:n + 1] - permuted[positions, positions + 1][:, None]
+                + permuted[1:n + 1, 2:n + 2] - permuted[positions + 1, positions + 2][None, :]
+                + (backward[None, :] - backward[:, None])
+                - (forward[None, :] - forward[:, None])
+            )
+            gain[~upper] = -np.inf
+            
+            i, j = np.unravel_index(int(gain.argmax()), gain.shape)
+            if gain[i, j] <= 1e-6:  # float32 rounding noise, not a real improvement
                 break
+            order[i:j + 1] = order[i:j + 1][::-1].copy()
         
-        return ordered_indices
+        return order.tolist()
     
     def _reinsert_empty_pages(
         self,
@@ -672,66 +907,50 @@ class PageOrderingAgent:
             logger.info("No empty pages to reinsert")
             return ordered_pages
         
-        logger.info(f"Reinserting {len(empty_pages)} empty pages into reordered sequence")
+        logger.info("Reinserting %s empty pages into reordered sequence", len(empty_pages))
         
-        # Create a mapping of page numbers to their original positions
-        original_positions = {p['page_number']: i for i, p in enumerate(all_original_pages)}
-        
-        # Create mappings for quick lookup
-        empty_pages_map = {p['page_number']: p for p in empty_pages}
-        non_empty_page_numbers = {p['page_number'] for p in ordered_pages}
+        # Original position of every page, indexed by page number (-1 if unknown)
+        max_page_number = max(p['page_number'] for p in (*all_original_pages, *ordered_pages, *empty_pages))
+        original_positions = np.full(max_page_number + 1, -1, dtype=np.int64)
+        original_positions[[p['page_number'] for p in all_original_pages]] = np.arange(len(all_original_pages))
         
         # CRITICAL: We must preserve the REORDERED order of non-empty pages
-        # and only insert empty pages at their original positions relative to the reordered sequence
-        
-        # Start with reordered pages in their new order
-        result = list(ordered_pages)  # This preserves the reordered sequence!
-        
-        # Now insert empty pages at their original positions relative to non-empty pages
-        # We need to find where each empty page should go in the reordered sequence
-        empty_pages_map = {p['page_number']: p for p in empty_pages}
-        
-        # For each empty page, find its position in the original order
-        # and insert it at the corresponding position in the reordered sequence
+        # and only insert empty pages at their original positions relative to the reordered sequence.
+        # Each empty page goes right before the first page in the reordered sequence that
+        # came after it originally (or at the end if there is none). The running maximum of
+        # the reordered pages' original positions is sorted, so that first page is found
+        # with a binary search.
+        reordered_positions = original_positions[[p['page_number'] for p in ordered_pages]]
+        reordered_positions[reordered_positions < 0] = np.iinfo(np.int64).max
+        running_max = np.maximum.accumulate(reordered_positions) if len(reordered_positions) else reordered_positions
+        
+        # Empty pages to insert before each reordered page; the last slot is the end
+        insert_before: List[List[Dict]] = [[] for _ in range(len(ordered_pages) + 1)]
         for empty_page in empty_pages:
-            empty_page_num = empty_page['page_number']
-            empty_original_pos = original_positions.get(empty_page_num, -1)
-            
+            empty_original_pos = int(original_positions[empty_page['page_number']])
             if empty_original_pos < 0:
                 continue
-            
-            # Find where to insert: find the first non-empty page that came after
-            # this empty page in the original order
-            insert_position = len(result)  # Default: append at end
-            
-            for i, ordered_page in enumerate(ordered_pages):
-                ordered_page_num = ordered_page['page_number']
-                ordered_original_pos = original_positions.get(ordered_page_num, 9999)
-                
-                # If this ordered page came after the empty page originally,
-                # insert the empty page before it
-                if ordered_original_pos > empty_original_pos:
-                    # Find the position of this ordered page in result
-                    for j, page in enumerate(result):
-                        if page['page_number'] == ordered_page_num:
-                            insert_position = j
-                            break
-                    break
-            
-            # Insert the empty page at the found position
-            result.insert(insert_position, empty_page)
-            logger.debug(f"Inserted empty page {empty_page_num} at position {insert_position}")
-        
-        logger.info(f"Final result: {len(result)} pages ({len([p for p in result if p['page_number'] in non_empty_page_numbers])} non-empty + {len(empty_pages)} empty)")
-        final_page_nums = [p['page_number'] for p in result]
-        logger.info(f"Final page order: {final_page_nums}")
+            insert_position = int(np.searchsorted(running_max, empty_original_pos, side='right'))
+            insert_before[insert_position].append(empty_page)
+        
+        # Merge in a single pass
+        result = []
+        for ordered_page, empties in zip(ordered_pages, insert_before):
+            result.extend(empties)
+            result.append(ordered_page)
+        result.extend(insert_before[-1])
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Final result: %s pages (%s non-empty + %s empty)", len(result), len(ordered_pages), len(result) - len(ordered_pages))
+            final_page_nums = [p['page_number'] for p in result]
+            logger.info("Final page order: %s", final_page_nums)
         
         return result
     
     def _calculate_confidence_scores(
         self,
         ordered_pages: List[Dict],
-        transition_scores: Dict[Tuple[int, int], float],
+        transition_scores: np.ndarray,
         llm_order: Dict
     ) -> List[float]:
         """Calculate confidence scores for the ordering."""
@@ -756,7 +975,7 @@ class PageOrderingAgent:
                 
                 # Only calculate transition if both pages are non-empty
                 if not prev_page.get('is_empty', False) and not page.get('is_empty', False):
-                    transition_score = transition_scores.get((prev_idx, curr_idx), 0.5)
+                    transition_score = float(transition_scores[prev_idx, curr_idx])
                     confidence = min(1.0, transition_score + 0.2)  # Boost slightly
                 else:
                     confidence = 0.6
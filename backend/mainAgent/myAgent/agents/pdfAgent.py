@@ -1,23 +1,93 @@
+import codecs
+import io
 import os
 import logging
 import re
+import shutil
+import subprocess
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Union, Any
 from fpdf import FPDF
 from datetime import datetime
-from PyPDF2 import PdfMerger, PdfReader, PdfWriter
+from PyPDF2 import PdfReader, PdfWriter
 import tempfile
 
 # Add DejaVu font path (commonly available on Linux/Unix systems)
 DEJAVU_FONT_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
 DEFAULT_FONT = 'DejaVu'  # Will fall back to Arial if DejaVu not available
+# Style variants shipped next to the regular face; missing ones fall back to regular
+DEJAVU_STYLE_FILES = {
+    'B': 'DejaVuSans-Bold.ttf',
+    'I': 'DejaVuSans-Oblique.ttf',
+    'BI': 'DejaVuSans-BoldOblique.ttf',
+}
+# qpdf merges in C++ without building the object graph in Python; optional
+QPDF_BINARY = shutil.which('qpdf')
 
 logger = logging.getLogger(__name__)
 
+# Typographic characters that have a readable ASCII equivalent
+_REPLACEMENTS = {
+    '•': '-',      # Bullet point to dash
+    '→': '->',     # Right arrow
+    '–': '-',      # En dash
+    '—': '--',     # Em dash
+    '“': '"',      # Left double quote
+    '”': '"',      # Right double quote
+    '‘': "'",      # Left single quote
+    '’': "'",      # Right single quote
+    '…': '...',    # Ellipsis
+}
+
+# Basic Multilingual Plane characters that are neither printable nor whitespace
+_UNPRINTABLE = {
+    code: None for code in range(0x10000)
+    if not (chr(code).isprintable() or chr(code).isspace())
+}
+
+# Text drawn with the embedded Unicode font only loses unprintable characters
+_UNICODE_CLEAN_TABLE = str.maketrans(_UNPRINTABLE)
+# Characters beyond the BMP, which the tables above do not cover
+_ASTRAL_RE = re.compile('[\U00010000-\U0010FFFF]')
+
+# Text drawn with a Latin core font also gets the ASCII replacements
+_CLEAN_TABLE = str.maketrans({**_REPLACEMENTS, **_UNPRINTABLE})
+
+
+def _ascii_fallback(error: UnicodeEncodeError) -> Tuple[str, int]:
+    """Codec error handler: '?' for printable non-ASCII characters, drop the rest."""
+    chunk = error.object[error.start:error.end]
+    return ''.join('?' for char in chunk if char.isprintable() or char.isspace()), error.end
+
+
+_ASCII_FALLBACK = 'pdfagent.ascii_fallback'
+codecs.register_error(_ASCII_FALLBACK, _ascii_fallback)
+
+# TOC heading detectors, compiled once: (pattern, level)
+_HEADING_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE), level) for pattern, level in [
+        # Level 1: Main titles (LOAN AGREEMENT, ARTICLE I, etc.)
+        (r'^(?:LOAN AGREEMENT|ARTICLE\s+[IVXLCDM]+|PART\s+[IVXLCDM]+|CHAPTER\s+\d+|SECTION\s+\d+)[\s:\.]*(.+)?$', 1),
+        # Level 2: Major sections (DEFINITIONS, TERMS AND CONDITIONS, etc.)
+        (r'^(?:DEFINITIONS|TERMS|CONDITIONS|GENERAL|SPECIFIC|APPENDIX|SCHEDULE)[\s:\.]*(.+)?$', 1),
+        (r'^([A-Z][A-Z\s]{3,50}?)[\s:\.]+$', 2),  # All caps headings
+        # Level 3: Subsections (numbered items)
+        (r'^\d+[\.\)]\s+([A-Z][^\n]{5,80})$', 3),
+        (r'^[a-z]\)\s+([A-Z][^\n]{5,80})$', 3),
+    ]
+]
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Characters in a document title that must not reach the generated filename
+_SAFE_FILENAME = str.maketrans(' /\\:', '____')
+
 class PDFAgent:
     """
     PDF Agent for generating well-formatted PDF documents with TOC and structured content
     """
+    # Heading style per section level; deeper levels reuse h3
+    HEADING_STYLES = ('h1', 'h2', 'h3')
+    
     def __init__(self, output_dir: str = 'output'):
         """
         Initialize the PDF Agent
@@ -41,6 +111,7 @@ class PDFAgent:
         
         # Initialize font paths
         self.font_available = False
+        self.font_files: Dict[str, str] = {}
         self._init_fonts()
     
     def _init_fonts(self):
@@ -50,6 +121,12 @@ class PDFAgent:
             if os.path.exists(DEJAVU_FONT_PATH):
                 self.font_available = True
                 self.default_font = 'DejaVu'
+                font_dir = os.path.dirname(DEJAVU_FONT_PATH)
+                self.font_files = {'': DEJAVU_FONT_PATH}
+                for style, filename in DEJAVU_STYLE_FILES.items():
+                    path = os.path.join(font_dir, filename)
+                    if os.path.exists(path):
+                        self.font_files[style] = path
                 return
                 
             # Fall back to Arial (supports many Unicode characters on Windows/macOS)
@@ -66,43 +143,44 @@ class PDFAgent:
         if not text or not isinstance(text, str):
             return ""
             
-        # Replace common problematic characters
-        replacements = {
-            '•': '-',      # Bullet point to dash
-            '→': '->',     # Right arrow
-            '–': '-',      # En dash
-            '—': '--',     # Em dash
-            '“': '"',      # Left double quote
-            '”': '"',      # Right double quote
-            '‘': "'",      # Left single quote
-            '’': "'",      # Right single quote
-            '…': '...',    # Ellipsis
-            '–': '-',      # Another type of dash
-            '—': '--'      # Another type of em dash
-        }
+        # Plain ASCII without control characters needs no cleaning
+        if text.isascii() and text.isprintable():
+            return text.strip()
+            
+        # The registered TTF font renders Unicode directly
+        if self.font_files:
+            text = text.translate(_UNICODE_CLEAN_TABLE)
+            if _ASTRAL_RE.search(text):
+                text = ''.join(char for char in text if char.isprintable() or char.isspace())
+            return text.strip()
+            
+        # Replacements and control characters are handled in C by translate(),
+        # remaining non-ASCII characters by the encoder's error handler
+        text = text.translate(_CLEAN_TABLE)
+        return text.encode('ascii', _ASCII_FALLBACK).decode('ascii').strip()
         
-        # First, replace known problematic characters
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-            
-        # Then remove any remaining non-printable characters
-        cleaned_text = []
-        for char in text:
-            if char.isprintable() or char.isspace():
-                # Replace any remaining non-ASCII characters with a safe alternative
-                if ord(char) > 127:  # Non-ASCII
-                    cleaned_text.append('?')
-                else:
-                    cleaned_text.append(char)
-        
-        return ''.join(cleaned_text).strip()
+    def _new_pdf(self) -> FPDF:
+        """
+        Create an FPDF document with the TTF fonts registered.
         
+        fpdf2 embeds only the glyphs actually used, so registering the full
+        DejaVu files does not bloat the output.
+        """
+        pdf = FPDF()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        for style, path in self.font_files.items():
+            pdf.add_font(self.default_font, style, path)
+        return pdf
+    
     def _set_font(self, pdf, style_name='normal'):
         """Set font with fallback to default if Unicode font not available."""
         style = self.styles.get(style_name, self.styles['normal'])
         
         if self.font_available:
-            pdf.set_font(self.default_font, style['style'], style['size'])
+            font_style = style['style']
+            if self.font_files and font_style not in self.font_files:
+                font_style = ''  # Variant not installed, use the regular face
+            pdf.set_font(self.default_font, font_style, style['size'])
         else:
             # Fallback to basic font
             pdf.set_font('Arial', style['style'], style['size'])
@@ -129,21 +207,26 @@ class PDFAgent:
         pdf.cell(0, 10, 'Table of Contents', 0, 1, 'C')
         pdf.ln(10)
         
+        # Entries share one font, selected once for the whole loop
+        self._set_font(pdf, 'normal')
+        set_x = pdf.set_x
+        cell = pdf.cell
+        
         for item in toc:
             # Add dots between title and page number
-            title = item.get('title', 'Untitled Section')
+            title = self._clean_text(item.get('title', 'Untitled Section'))
             page_num = str(item.get('page', ''))
             
             # Set indentation based on level
             indent = (item.get('level', 1) - 1) * 10
-            pdf.set_x(10 + indent)
+            set_x(10 + indent)
             
             # Add title and page number
-            pdf.cell(0, 10, title, 0, 0, 'L')
+            cell(0, 10, title, 0, 0, 'L')
             
             # Add dotted line
-            pdf.set_x(180 - indent)
-            pdf.cell(0, 10, page_num, 0, 1, 'R')
+            set_x(180 - indent)
+            cell(0, 10, page_num, 0, 1, 'R')
         
         pdf.add_page()
     
@@ -155,9 +238,9 @@ class PDFAgent:
         
         # Add section title
         level = section.get('level', 1)
-        style = self.styles[f'h{min(level, 3)}']
+        heading_style = self.HEADING_STYLES[min(max(level, 1), 3) - 1]
         
-        self._set_font(pdf, f'h{min(level, 3)}')
+        self._set_font(pdf, heading_style)
         pdf.cell(0, 10, title, 0, 1, 'L')
         pdf.ln(5)
         
@@ -172,7 +255,8 @@ class PDFAgent:
         title: str = "Document",
         author: str = "PDF Agent",
         add_toc: bool = True,
-        output_path: Optional[str] = None
+        output_path: Optional[str] = None,
+        compress: bool = True
     ) -> Dict[str, Any]:
         """
         Generate a PDF document from structured content
@@ -183,14 +267,19 @@ class PDFAgent:
             author: Document author
             add_toc: Whether to include a table of contents
             output_path: Path to save the PDF (default: auto-generated)
+            compress: Deflate content streams; disable for intermediate PDFs
+                      that are merged or rewritten afterwards
             
         Returns:
             Dictionary with the path to the generated PDF and metadata
         """
         try:
+            # One timestamp for both the cover page and the filename
+            now = datetime.now()
+            
             # Initialize PDF
-            pdf = FPDF()
-            pdf.set_auto_page_break(auto=True, margin=15)
+            pdf = self._new_pdf()
+            pdf.set_compression(compress)
             
             # Clean title and author
             clean_title = self._clean_text(title)
@@ -206,7 +295,7 @@ class PDFAgent:
             pdf.cell(0, 100, '', 0, 1, 'C')  # Add some space
             pdf.cell(0, 20, clean_title, 0, 1, 'C')
             self._set_font(pdf, 'normal')
-            pdf.cell(0, 10, f'Generated on {datetime.now().strftime("%Y-%m-%d")}', 0, 1, 'C')
+            pdf.cell(0, 10, f'Generated on {now.strftime("%Y-%m-%d")}', 0, 1, 'C')
             
             # Process content
             if isinstance(content, str):
@@ -225,14 +314,14 @@ class PDFAgent:
                         pdf.add_page()
                     self._add_section(pdf, section)
             
-            # Generate output path if not provided
+            # Generate output path if not provided (output_dir exists since __init__)
             if not output_path:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{title.replace(' ', '_')}_{timestamp}.pdf"
+                timestamp = now.strftime("%Y%m%d_%H%M%S")
+                filename = f"{title.translate(_SAFE_FILENAME)}_{timestamp}.pdf"
                 output_path = str(self.output_dir / filename)
-            
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            else:
+                # Ensure the directory exists
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
             
             # Save the PDF
             pdf.output(output_path)
@@ -266,31 +355,56 @@ class PDFAgent:
             if not file_paths:
                 return {'success': False, 'error': 'No files to merge'}
             
-            # Generate output path if not provided
+            # Drop missing inputs before touching the output
+            existing_paths = []
+            for pdf_path in file_paths:
+                if os.path.isfile(pdf_path):
+                    existing_paths.append(pdf_path)
+                else:
+                    logger.warning(f"File not found: {pdf_path}")
+            
+            if not existing_paths:
+                return {'success': False, 'error': 'None of the files to merge exist'}
+            
+            # Generate output path if not provided (output_dir exists since __init__)
             if not output_path:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 output_path = str(self.output_dir / f"merged_{timestamp}.pdf")
+            else:
+                # Ensure the output directory exists
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
             
-            # Ensure the output directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            # Merge PDFs
-            merger = PdfMerger()
-            
-            for pdf_path in file_paths:
-                if not os.path.exists(pdf_path):
-                    logger.warning(f"File not found: {pdf_path}")
-                    continue
-                merger.append(pdf_path)
-            
-            # Save the merged PDF
-            merger.write(output_path)
-            merger.close()
+            merged = False
+            if QPDF_BINARY:
+                try:
+                    result = subprocess.run(
+                        [QPDF_BINARY, '--empty', '--pages',
+                         *(os.path.abspath(pdf_path) for pdf_path in existing_paths),
+                         '--', os.path.abspath(output_path)],
+                        capture_output=True
+                    )
+                    # Exit status 3 means qpdf only warned and still wrote the output
+                    merged = result.returncode in (0, 3)
+                    if not merged:
+                        logger.warning(f"qpdf merge failed, falling back to PyPDF2: {result.stderr.decode(errors='replace').strip()}")
+                except OSError as e:
+                    logger.warning(f"qpdf could not be run, falling back to PyPDF2: {str(e)}")
+            
+            if not merged:
+                # Merge PDFs; the writer shares page objects with the readers and
+                # skips copying each input's outline tree
+                writer = PdfWriter()
+                
+                for pdf_path in existing_paths:
+                    writer.append(pdf_path, import_outline=False)
+                
+                # Save the merged PDF
+                writer.write(output_path)
             
             return {
                 'success': True,
                 'file_path': output_path,
-                'merged_files': len(file_paths)
+                'merged_files': len(existing_paths)
             }
             
         except Exception as e:
@@ -311,17 +425,6 @@ class PDFAgent:
             List of TOC entries with title, level, and page number
         """
         toc_entries = []
-        heading_patterns = [
-            # Level 1: Main titles (LOAN AGREEMENT, ARTICLE I, etc.)
-            (r'^(?:LOAN AGREEMENT|ARTICLE\s+[IVXLCDM]+|PART\s+[IVXLCDM]+|CHAPTER\s+\d+|SECTION\s+\d+)[\s:\.]*(.+)?$', 1),
-            # Level 2: Major sections (DEFINITIONS, TERMS AND CONDITIONS, etc.)
-            (r'^(?:DEFINITIONS|TERMS|CONDITIONS|GENERAL|SPECIFIC|APPENDIX|SCHEDULE)[\s:\.]*(.+)?$', 1),
-            (r'^([A-Z][A-Z\s]{3,50}?)[\s:\.]+$', 2),  # All caps headings
-            # Level 3: Subsections (numbered items)
-            (r'^\d+[\.\)]\s+([A-Z][^\n]{5,80})$', 3),
-            (r'^[a-z]\)\s+([A-Z][^\n]{5,80})$', 3),
-        ]
-        
         for idx, page in enumerate(pages):
             text = page.get('text', '')
             # Use position in reordered PDF (1-based), not original page number
@@ -330,19 +433,19 @@ class PDFAgent:
             if not text:
                 continue
                 
-            lines = text.split('\n')
+            lines = text.split('\n', 20)
             for line in lines[:20]:  # Check first 20 lines of each page
                 line = line.strip()
                 if len(line) < 5 or len(line) > 100:
                     continue
                     
                 # Check each pattern
-                for pattern, level in heading_patterns:
-                    match = re.match(pattern, line, re.IGNORECASE)
+                for pattern, level in _HEADING_PATTERNS:
+                    match = pattern.match(line)
                     if match:
                         title = match.group(1).strip() if match.groups() and match.group(1) else line.strip()
                         # Clean up title
-                        title = re.sub(r'\s+', ' ', title)
+                        title = _WHITESPACE_RE.sub(' ', title)
                         if len(title) > 80:
                             title = title[:77] + '...'
                         
@@ -358,20 +461,18 @@ class PDFAgent:
         
         return toc_entries
     
-    def _create_toc_pdf(self, toc_entries: List[Dict[str, Any]], output_path: str) -> bool:
+    def _create_toc_pdf(self, toc_entries: List[Dict[str, Any]]) -> Optional[bytes]:
         """
         Create a PDF page with table of contents.
         
         Args:
             toc_entries: List of TOC entries
-            output_path: Path to save the TOC PDF
             
         Returns:
-            True if successful, False otherwise
+            The TOC PDF as bytes if successful, None otherwise
         """
         try:
-            pdf = FPDF()
-            pdf.set_auto_page_break(auto=True, margin=15)
+            pdf = self._new_pdf()
             pdf.add_page()
             
             # Title
@@ -404,12 +505,10 @@ class PDFAgent:
                 pdf.cell(20, 8, str(adjusted_page_num), 0, 1, 'R')
                 pdf.ln(2)
             
-            # Save
-            pdf.output(output_path)
-            return True
+            return bytes(pdf.output())
         except Exception as e:
             logger.error(f"Error creating TOC PDF: {e}", exc_info=True)
-            return False
+            return None
     
     def reorder_pdf_pages(
         self,
@@ -471,67 +570,56 @@ class PDFAgent:
                     'error': f'Page order must include all {total_pages} pages exactly once'
                 }
             
-            # Create a writer to build the reordered PDF
-            writer = PdfWriter()
-            
-            # Add pages in the specified order (convert to 0-based indexing)
-            for page_num in page_order:
-                page_index = page_num - 1  # Convert to 0-based
-                writer.add_page(reader.pages[page_index])
-            
-            # Generate output path if not provided
-            if not output_path:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                base_name = os.path.splitext(os.path.basename(input_pdf_path))[0]
-                output_path = str(self.output_dir / f"{base_name}_reordered_{timestamp}.pdf")
-            
-            # Ensure the output directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            # Write the reordered PDF temporarily
-            temp_output = output_path + '.temp'
-            with open(temp_output, 'wb') as output_file:
-                writer.write(output_file)
-            
-            # Generate and add TOC if requested and ordered_pages provided
+            # Build the TOC first so its pages can lead the same writer;
+            # the reordered PDF is then written once, without a temp file
             toc_entries = []
+            toc_reader = None
             if add_toc and ordered_pages:
                 try:
                     logger.info("📑 Generating table of contents...")
                     toc_entries = self._detect_headings(ordered_pages)
                     
                     if toc_entries:
-                        # Create TOC PDF page
-                        toc_pdf_path = temp_output + '_toc.pdf'
-                        if self._create_toc_pdf(toc_entries, toc_pdf_path):
-                            # Merge TOC page with reordered PDF
-                            merger = PdfMerger()
-                            merger.append(toc_pdf_path)  # TOC first
-                            merger.append(temp_output)    # Then reordered pages
-                            merger.write(output_path)
-                            merger.close()
-                            
-                            # Clean up temp files
-                            os.remove(temp_output)
-                            os.remove(toc_pdf_path)
-                            
-                            logger.info(f"✅ Added TOC with {len(toc_entries)} entries")
+                        toc_pdf = self._create_toc_pdf(toc_entries)
+                        if toc_pdf:
+                            toc_reader = PdfReader(io.BytesIO(toc_pdf))
                         else:
                             # TOC generation failed, use reordered PDF without TOC
-                            os.rename(temp_output, output_path)
                             logger.warning("⚠️  TOC generation failed, proceeding without TOC")
                     else:
                         # No headings detected, use reordered PDF without TOC
-                        os.rename(temp_output, output_path)
                         logger.info("ℹ️  No headings detected, proceeding without TOC")
                 except Exception as e:
                     logger.warning(f"⚠️  Error adding TOC: {e}, proceeding without TOC")
-                    # Use reordered PDF without TOC
-                    if os.path.exists(temp_output):
-                        os.rename(temp_output, output_path)
+            
+            # Create a writer to build the reordered PDF
+            writer = PdfWriter()
+            
+            # TOC first
+            if toc_reader is not None:
+                for page in toc_reader.pages:
+                    writer.add_page(page)
+            
+            # Add pages in the specified order (convert to 0-based indexing)
+            for page_num in page_order:
+                page_index = page_num - 1  # Convert to 0-based
+                writer.add_page(reader.pages[page_index])
+            
+            # Generate output path if not provided (output_dir exists since __init__)
+            if not output_path:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                base_name = os.path.splitext(os.path.basename(input_pdf_path))[0]
+                output_path = str(self.output_dir / f"{base_name}_reordered_{timestamp}.pdf")
             else:
-                # No TOC requested, just rename temp file
-                os.rename(temp_output, output_path)
+                # Ensure the output directory exists
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            
+            # Write the reordered PDF
+            with open(output_path, 'wb') as output_file:
+                writer.write(output_file)
+            
+            if toc_reader is not None:
+                logger.info(f"✅ Added TOC with {len(toc_entries)} entries")
             
             logger.info(f"✅ Successfully reordered PDF: {input_pdf_path} -> {output_path}")
             logger.info(f"   Original order: {list(range(1, total_pages + 1))}")
@@ -540,7 +628,7 @@ class PDFAgent:
             return {
                 'success': True,
                 'file_path': output_path,
-                'page_count': total_pages + (1 if toc_entries else 0),  # +1 for TOC page
+                'page_count': len(writer.pages),  # Includes the TOC pages
                 'original_order': list(range(1, total_pages + 1)),
                 'new_order': page_order,
                 'toc_entries': toc_entries if toc_entries else None
@@ -5,7 +5,6 @@ from pathlib import Path
 import json
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from .llmAgent import LLMAgent
 
@@ -98,7 +97,10 @@ class QueryAgent:
             
             # Calculate similarities
             logger.info("Calculating cosine similarities...")
-            similarities = cosine_similarity(query_embedding, chunk_embeddings)[0]
+            query_vector = query_embedding[0]
+            norms = np.linalg.norm(chunk_embeddings, axis=1) * np.linalg.norm(query_vector)
+            # Zero vectors score 0, as with sklearn's cosine_similarity
+            similarities = (chunk_embeddings @ query_vector) / np.where(norms == 0, 1.0, norms)
             
             # Log all similarity scores
             for i, score in enumerate(similarities):
@@ -1,3 +1,175 @@
-from django.test import TestCase
+import os
+import pickle
+import subprocess
+import tempfile
+import zlib
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from .agents import embeddingsAgent, pageOrderingAgent, pdfAgent
+from .agents.embeddingsAgent import EmbeddingsAgent
+from .agents.ocrAgent import OCRAgent
+from .agents.pageOrderingAgent import PageOrderingAgent
+from .agents.pdfAgent import PDFAgent
+
+
+class FakeSentenceModel:
+    """Deterministic stand-in for SentenceTransformer: one random vector per text"""
+
+    dimension = 64
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        vectors = np.stack([
+            np.random.default_rng(zlib.crc32(text.encode())).standard_normal(self.dimension)
+            for text in texts
+        ]).astype(np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+class EmbeddingsAgentIndexTests(SimpleTestCase):
+    def setUp(self):
+        with mock.patch.object(EmbeddingsAgent, '_load_model', return_value=FakeSentenceModel()):
+            self.agent = EmbeddingsAgent()
+        tmp_dir = Path(tempfile.mkdtemp())
+        self.agent.index_path = tmp_dir / 'embeddings_index.faiss'
+        self.agent.documents_path = tmp_dir / 'documents.pkl'
+
+    def test_single_vector_first_batch_does_not_fix_the_index(self):
+        self.assertTrue(self.agent.create_embeddings(['lonely first document'])['success'])
+        later_texts = [f'document number {i}' for i in range(40)]
+        self.assertTrue(self.agent.create_embeddings(later_texts)['success'])
+
+        for query in ['lonely first document', 'document number 7', 'document number 33']:
+            results = self.agent.search_similar(query, k=1)
+            self.assertEqual(results[0]['text'], query)
+            self.assertAlmostEqual(results[0]['score'], 1.0, places=2)
+
+    def test_ivfpq_is_trained_on_every_stored_vector(self):
+        with mock.patch.object(embeddingsAgent, 'IVFPQ_MIN_VECTORS', 300):
+            self.agent.create_embeddings(['seed document'])
+            self.assertNotIsInstance(self.agent.embeddings_index, embeddingsAgent.faiss.IndexIVF)
+            self.agent.create_embeddings([f'document number {i}' for i in range(400)])
+
+        self.assertIsInstance(self.agent.embeddings_index, embeddingsAgent.faiss.IndexIVF)
+        self.assertEqual(self.agent.embeddings_index.ntotal, 401)
+        self.assertEqual(self.agent.get_document_count(), 401)
+
+    def test_legacy_l2_index_is_rebuilt_as_cosine(self):
+        texts = [f'document number {i}' for i in range(10)]
+        raw = FakeSentenceModel().encode(texts) * 5.0
+        legacy_index = embeddingsAgent.faiss.IndexFlatL2(raw.shape[1])
+        legacy_index.add(raw)
+        embeddingsAgent.faiss.write_index(legacy_index, str(self.agent.index_path))
+        with open(self.agent.documents_path, 'wb') as f:
+            pickle.dump([{'text': text, 'metadata': {}} for text in texts], f)
+
+        self.assertTrue(self.agent._load_index())
+        self.assertEqual(self.agent.embeddings_index.metric_type, embeddingsAgent.faiss.METRIC_INNER_PRODUCT)
+        results = self.agent.search_similar('document number 4', k=2)
+        self.assertEqual(results[0]['text'], 'document number 4')
+        self.assertAlmostEqual(results[0]['score'], 1.0, places=2)
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+
+class PresortedOrderTests(SimpleTestCase):
+    def setUp(self):
+        with mock.patch.object(pageOrderingAgent, '_get_embedding_model'), \
+                mock.patch.object(pageOrderingAgent, '_get_llm_agent'):
+            self.agent = PageOrderingAgent()
+
+    @staticmethod
+    def _similarity(embeddings):
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        similarity = (embeddings @ embeddings.T).astype(np.float32)
+        np.fill_diagonal(similarity, 0.0)
+        return similarity
+
+    def test_shuffled_single_topic_document_is_not_kept(self):
+        # Every page shares one topic, so all pairs are highly similar
+        rng = np.random.default_rng(0)
+        topic = rng.standard_normal(64)
+        pages = topic + 0.3 * rng.standard_normal((12, 64))
+        similarity = self._similarity(pages[rng.permutation(12)])
+
+        self.assertGreater(np.diag(similarity, k=1).mean(), self.agent.presorted_threshold)
+        self.assertIsNone(self.agent._presorted_order(similarity))
+
+    def test_continuous_document_keeps_input_order(self):
+        # Each page drifts a little from the previous one
+        rng = np.random.default_rng(0)
+        a, b = rng.standard_normal((2, 64))
+        angles = 0.3 * np.arange(12)
+        pages = np.cos(angles)[:, None] * a + np.sin(angles)[:, None] * b
+        result = self.agent._presorted_order(self._similarity(pages))
+
+        self.assertIsNotNone(result)
+        self.assertEqual(result['order'], list(range(12)))
+
+
+class OCRBatchTests(SimpleTestCase):
+    def test_one_unrenderable_page_does_not_fail_the_batch(self):
+        def render_page(pdf_path, page_num):
+            if page_num == 3:
+                raise RuntimeError('broken page')
+            return f'image {page_num}'
+
+        agent = OCRAgent()
+        with mock.patch.object(agent, '_render_page', side_effect=render_page), \
+                mock.patch.object(agent, '_ocr_images', side_effect=lambda images: [(f'text of {image}', 0.9) for image in images]):
+            results = agent.extract_with_ocr_batch(Path('scan.pdf'), [1, 2, 3, 4])
+
+        self.assertEqual(sorted(results), [1, 2, 3, 4])
+        self.assertFalse(results[3]['success'])
+        self.assertIn('broken page', results[3]['error'])
+        for page_num in [1, 2, 4]:
+            self.assertTrue(results[page_num]['success'])
+            self.assertEqual(results[page_num]['page']['text'], f'text of image {page_num}')
+
+
+class CleanTextTests(SimpleTestCase):
+    def test_unicode_and_ascii_fonts_drop_the_same_unprintable_characters(self):
+        agent = PDFAgent(tempfile.mkdtemp())
+        # Private use and tag characters from the supplementary planes
+        text = 'Total\U000F0000 due\U000E0001\n'
+
+        agent.font_files = {'': 'DejaVuSans.ttf'}
+        self.assertEqual(agent._clean_text(text), 'Total due')
+        agent.font_files = {}
+        self.assertEqual(agent._clean_text(text), 'Total due')
+
+
+class MergePdfsTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.agent = PDFAgent(str(self.tmp_dir))
+        self.inputs = []
+        for name in ['a.pdf', 'b.pdf']:
+            writer = pdfAgent.PdfWriter()
+            writer.add_blank_page(width=200, height=200)
+            writer.write(str(self.tmp_dir / name))
+            self.inputs.append(str(self.tmp_dir / name))
+
+    def test_qpdf_warnings_keep_its_output(self):
+        completed = subprocess.CompletedProcess([], 3, b'', b'WARNING: recovered xref')
+        with mock.patch.object(pdfAgent, 'QPDF_BINARY', '/usr/bin/qpdf'), \
+                mock.patch.object(pdfAgent.subprocess, 'run', return_value=completed) as run, \
+                mock.patch.object(pdfAgent, 'PdfWriter') as writer:
+            result = self.agent.merge_pdfs(self.inputs, 'merged.pdf')
+
+        self.assertTrue(result['success'])
+        writer.assert_not_called()
+        self.assertEqual(run.call_args.args[0][-1], os.path.abspath('merged.pdf'))
+
+    def test_unrunnable_qpdf_falls_back_to_pypdf2(self):
+        output_path = str(self.tmp_dir / 'merged.pdf')
+        with mock.patch.object(pdfAgent, 'QPDF_BINARY', '/usr/bin/qpdf'), \
+                mock.patch.object(pdfAgent.subprocess, 'run', side_effect=PermissionError('not executable')):
+            result = self.agent.merge_pdfs(self.inputs, output_path)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(len(pdfAgent.PdfReader(output_path).pages), 2)